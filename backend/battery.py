@@ -0,0 +1,163 @@
+"""Incremental battery drain estimation and low-battery alerting.
+
+Readings are compared with an anchor, the lowest recent reading. A
+discharge rate is only folded in once the percentage has dropped at least
+min_drop below the anchor, so the +-1% jitter of a flat battery never
+looks like drain. The rate goes into an EWMA for the power state at the
+anchor (sleep_mode, gps_fix, wifi_enabled). Small rises are ignored; a
+rise of rearm_charge or more counts as charging. Time to empty is the
+current percentage over the rate for the current state. Everything is
+O(1) per sample so it runs inline on ingest.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+State = Tuple[bool, bool, bool]  # (sleep_mode, gps_fix, wifi_enabled)
+
+
+def state_name(state: State) -> str:
+    sleep, gps, wifi = state
+    return f"{'sleep' if sleep else 'awake'}{'+gps' if gps else ''}{'+wifi' if wifi else ''}"
+
+
+@dataclass
+class RateEstimate:
+    pct_per_hour: float = 0.0
+    volts_per_hour: float = 0.0
+    samples: int = 0
+
+    def add(self, pct_rate: float, volt_rate: float, alpha: float):
+        if self.samples == 0:
+            self.pct_per_hour, self.volts_per_hour = pct_rate, volt_rate
+        else:
+            self.pct_per_hour += alpha * (pct_rate - self.pct_per_hour)
+            self.volts_per_hour += alpha * (volt_rate - self.volts_per_hour)
+        self.samples += 1
+
+
+@dataclass
+class BatteryEstimator:
+    thresholds: List[float] = field(default_factory=lambda: [24.0, 6.0])  # hours left that alert
+    alpha: float = 0.3
+    min_interval: float = 120.0       # seconds; shorter gaps are too noisy at 1% resolution
+    max_interval: float = 12 * 3600   # seconds; longer gaps likely span a charge or reboot
+    min_drop: int = 2                 # percent below the anchor before a rate is measured
+    rearm_charge: int = 5             # percent gained that counts as charging and re-arms alerts
+
+    rates: Dict[State, RateEstimate] = field(default_factory=dict)
+    overall: RateEstimate = field(default_factory=RateEstimate)
+    anchor: Optional[Tuple[float, int, float, State]] = None  # (ts, pct, voltage, state)
+    last: Optional[Tuple[float, int, float, State]] = None    # latest reading, for reporting
+    alerted: set = field(default_factory=set)
+    revision: int = 0                 # bumped whenever the persisted state changes
+
+    def update(self, pct: int, voltage: float, sleep_mode: bool, gps_fix: bool,
+               wifi_enabled: bool, ts: float) -> Optional[float]:
+        """Fold in one status sample; returns the threshold (hours) that just got crossed"""
+        state = (bool(sleep_mode), bool(gps_fix), bool(wifi_enabled))
+        reading = (ts, pct, voltage, state)
+        self.last = reading
+
+        if self.anchor is None:
+            self._reanchor(reading)
+            return self._check(pct, state)
+
+        anchor_ts, anchor_pct, anchor_voltage, anchor_state = self.anchor
+        dt = ts - anchor_ts
+        if dt < 0 or dt > self.max_interval:
+            # Too long to attribute to one discharge; start over from here
+            self._reanchor(reading)
+        elif pct - anchor_pct >= self.rearm_charge:
+            # Charging: start a fresh discharge curve and allow alerts again
+            self.alerted.clear()
+            self._reanchor(reading)
+        elif anchor_pct - pct >= self.min_drop and dt >= self.min_interval:
+            hours = dt / 3600
+            pct_rate = (anchor_pct - pct) / hours
+            volt_rate = (anchor_voltage - voltage) / hours
+            self.rates.setdefault(anchor_state, RateEstimate()).add(pct_rate, volt_rate, self.alpha)
+            self.overall.add(pct_rate, volt_rate, self.alpha)
+            self._reanchor(reading)
+        # Otherwise jitter or a slow drain still within min_drop: keep the anchor
+
+        return self._check(pct, state)
+
+    def _reanchor(self, reading: Tuple[float, int, float, State]):
+        self.anchor = reading
+        self.revision += 1
+
+    def rate_for(self, state: State) -> Optional[float]:
+        estimate = self.rates.get(state)
+        if estimate is not None and estimate.samples >= 2:
+            return estimate.pct_per_hour
+        if self.overall.samples >= 2:
+            return self.overall.pct_per_hour
+        return None
+
+    def hours_left(self, pct: int, state: State) -> Optional[float]:
+        rate = self.rate_for(state)
+        if rate is None or rate <= 0:
+            return None
+        return pct / rate
+
+    def _check(self, pct: int, state: State) -> Optional[float]:
+        hours = self.hours_left(pct, state)
+        if hours is None:
+            return None
+        crossed = None
+        for threshold in sorted(self.thresholds):
+            if hours <= threshold and threshold not in self.alerted:
+                crossed = threshold if crossed is None else crossed
+                self.alerted.add(threshold)
+                self.revision += 1
+        return crossed
+
+    def summary(self) -> dict:
+        current = None
+        if self.last is not None:
+            _, pct, voltage, state = self.last
+            hours = self.hours_left(pct, state)
+            current = {
+                "bat_percent": pct,
+                "bat_voltage": voltage,
+                "state": state_name(state),
+                "pct_per_hour": round(self.rate_for(state) or 0.0, 3),
+                "hours_left": round(hours, 1) if hours is not None else None,
+            }
+        return {
+            "current": current,
+            "thresholds_hours": sorted(self.thresholds),
+            "alerted": sorted(self.alerted),
+            "rates": {
+                state_name(s): {
+                    "pct_per_hour": round(r.pct_per_hour, 3),
+                    "volts_per_hour": round(r.volts_per_hour, 4),
+                    "samples": r.samples,
+                }
+                for s, r in self.rates.items()
+            },
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "rates": [
+                {"state": list(s), "pct_per_hour": r.pct_per_hour, "volts_per_hour": r.volts_per_hour, "samples": r.samples}
+                for s, r in self.rates.items()
+            ],
+            "overall": vars(self.overall),
+            "anchor": list(self.anchor[:3]) + [list(self.anchor[3])] if self.anchor else None,
+            "alerted": sorted(self.alerted),
+        }
+
+    def load(self, data: dict):
+        """Restore the state persisted by to_dict()"""
+        for entry in data.get("rates") or []:
+            state = tuple(bool(x) for x in entry["state"])
+            self.rates[state] = RateEstimate(entry["pct_per_hour"], entry["volts_per_hour"], int(entry["samples"]))
+        overall = data.get("overall")
+        if isinstance(overall, dict):
+            self.overall = RateEstimate(**overall)
+        anchor = data.get("anchor")
+        if isinstance(anchor, list) and len(anchor) == 4:
+            self.anchor = (float(anchor[0]), int(anchor[1]), float(anchor[2]), tuple(bool(x) for x in anchor[3]))
+        self.alerted = {float(h) for h in data.get("alerted") or []}
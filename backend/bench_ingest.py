@@ -0,0 +1,286 @@
+"""Benchmark the /api/webhook/mqtt ingest path against in-process fakes.
+
+Examples:
+    python bench_ingest.py --count 2000 --concurrency 16
+    python bench_ingest.py --mix status=5,location=3,logs=1,espnow=1 --firebase-latency-ms 40
+    python bench_ingest.py --replay recorded.jsonl --json bench_result.json
+
+A replay file holds one webhook body per line ({"topic": ..., "payload": ...}),
+or is a capture written with MQTT_RECORD_PATH (see replay.py).
+
+Needs httpx on top of the server requirements: pip install -r requirements-dev.txt
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import fakes
+from recorder import read_recording
+
+
+def sample_status() -> dict:
+    return {
+        "send_reason": random.choice([0, 1, 2, 3, 4, 5, 6]),
+        "screen_on": False,
+        "sleep_mode": random.random() < 0.5,
+        "currently_active": True,
+        "last_activity": "00:00:12",
+        "bat_voltage": round(random.uniform(3.4, 4.2), 2),
+        "bat_percent": random.randint(5, 100),
+        "gsm_rssi": random.randint(-110, -60),
+        "wifi_enabled": False,
+        "wifi_rssi": 0,
+        "wifi": "",
+        "in_call": False,
+        "locked": False,
+        "light_level": random.randint(0, 4095),
+        "uptime": "01:02:03",
+        "espnow_state": 0,
+        "stored_sms": 3,
+        "prd_eps": False,
+        "ble_beacon": False,
+        "gps_fix": random.random() < 0.7,
+        "prd_wakeup_counter": random.randint(0, 50),
+        "temp_contact": "",
+        "build": "bench",
+    }
+
+
+def sample_location() -> dict:
+    return {
+        "send_reason": random.choice([1, 3, 4, 5]),
+        "prd_wakeup_num": random.randint(0, 50),
+        "gps_lat": 12.97 + random.uniform(-0.05, 0.05),
+        "gps_lon": 77.59 + random.uniform(-0.05, 0.05),
+        "lbs_lat": 12.97 + random.uniform(-0.05, 0.05),
+        "lbs_lon": 77.59 + random.uniform(-0.05, 0.05),
+        "sats": random.randint(0, 12),
+        "alt": 920.0,
+        "speed": random.uniform(0, 60),
+        "course": random.uniform(0, 360),
+        "gps_fix": random.random() < 0.8,
+        "lbs_fix": random.random() < 0.5,
+    }
+
+
+def sample_logs() -> dict:
+    return {
+        "type": random.choice(["info", "info", "info", "warning", "error"]),
+        "log": "modem: AT+CSQ timeout",
+    }
+
+
+def sample_espnow() -> str:
+    return random.choice(["node1: DETECTED", "node2: heartbeat", "node3: IMPORTANT door open"])
+
+
+SAMPLES = {
+    "status": ("Tracker/from/status", sample_status),
+    "location": ("Tracker/from/location", sample_location),
+    "logs": ("Tracker/from/logs", sample_logs),
+    "espnow": ("Tracker/from/espnow/received", sample_espnow),
+}
+
+
+def seed_state(env):
+    """Give the fake database the nodes a running deployment already has"""
+    root = env.database.reference("/")
+    root.child("Preferences").set({"tracker_autowake": False})
+    root.child("PushTokens/default_user").set({"token": "bench-token"})
+    root.child("Tracker/MQTT").set({"connected": True})
+    root.child("Tracker/location/latest").set({**sample_location(), "gps_fix": True, "lbs_fix": True})
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SAMPLES:
+            raise SystemExit(f"Unknown topic in mix: {name} (choose from {', '.join(SAMPLES)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def build_bodies(args) -> List[dict]:
+    if args.replay:
+        bodies = [body for _, body in read_recording(args.replay)]
+        return (bodies * (args.count // len(bodies) + 1))[:args.count] if args.count else bodies
+
+    mix = parse_mix(args.mix)
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    bodies = []
+    for name in random.choices(names, weights, k=args.count):
+        topic, factory = SAMPLES[name]
+        payload = factory()
+        bodies.append({
+            "topic": topic,
+            "payload": payload if isinstance(payload, str) else json.dumps(payload),
+        })
+    return bodies
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+class LoopMonitor:
+    """Measures how long the event loop was blocked beyond a fixed tick"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.blocked = 0.0
+        self.max_lag = 0.0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = loop.time() - start - self.interval
+            if lag > 0:
+                self.blocked += lag
+                self.max_lag = max(self.max_lag, lag)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # Let a tick that was starved by the last request record its lag
+        await asyncio.sleep(self.interval * 2)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+async def run(args, env) -> dict:
+    import httpx
+    import server
+
+    bodies = build_bodies(args)
+    seed_state(env)
+    await server.app.router.startup()
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    queue: asyncio.Queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker():
+            while True:
+                try:
+                    body = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                # A real socket read yields here; the in-memory transport does not
+                await asyncio.sleep(0)
+                topic = body.get("topic", "").rsplit("/from/", 1)[-1]
+                t0 = time.perf_counter()
+                response = await client.post("/api/webhook/mqtt", json=body)
+                latencies[topic].append(time.perf_counter() - t0)
+                if response.status_code != 200:
+                    errors[topic] += 1
+
+        monitor = LoopMonitor()
+        monitor.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        await monitor.stop()
+
+    await server.app.router.shutdown()
+
+    every = [v for values in latencies.values() for v in values]
+    return {
+        "messages": len(every),
+        "errors": sum(errors.values()),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_msg_s": round(len(every) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(every, 50) * 1000, 3),
+        "p99_ms": round(percentile(every, 99) * 1000, 3),
+        "loop_blocked_ms": round(monitor.blocked * 1000, 1),
+        "loop_max_lag_ms": round(monitor.max_lag * 1000, 1),
+        "firebase_calls": env.database.calls,
+        "emqx_publishes": len(env.emqx.published),
+        "fcm_sends": len(env.messaging.sent),
+        "topics": {
+            topic: {
+                "count": len(values),
+                "errors": errors[topic],
+                "mean_ms": round(statistics.fmean(values) * 1000, 3),
+                "p50_ms": round(percentile(values, 50) * 1000, 3),
+                "p99_ms": round(percentile(values, 99) * 1000, 3),
+            }
+            for topic, values in sorted(latencies.items())
+        },
+    }
+
+
+def print_report(result: dict):
+    print(f"messages:        {result['messages']} ({result['errors']} errors)")
+    print(f"throughput:      {result['throughput_msg_s']} msg/s over {result['elapsed_s']} s")
+    print(f"latency:         p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms")
+    print(f"loop blocked:    {result['loop_blocked_ms']} ms total, max lag {result['loop_max_lag_ms']} ms")
+    print(f"backend calls:   firebase {result['firebase_calls']}, emqx {result['emqx_publishes']}, fcm {result['fcm_sends']}")
+    print()
+    print(f"{'topic':<20}{'count':>8}{'errors':>8}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for topic, row in result["topics"].items():
+        print(f"{topic:<20}{row['count']:>8}{row['errors']:>8}{row['mean_ms']:>10}{row['p50_ms']:>10}{row['p99_ms']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=1000, help="messages to send")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent webhook callers")
+    parser.add_argument("--mix", default="status=4,location=3,logs=2,espnow=1", help="topic weights")
+    parser.add_argument("--replay", help="JSONL file or capture of recorded webhook bodies")
+    parser.add_argument("--firebase-latency-ms", type=float, default=0.0)
+    parser.add_argument("--fcm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--emqx-latency-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the result to this file")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+
+    # Replays loop over the same bodies; don't let dedup turn them into no-ops
+    os.environ.setdefault("DEDUP_TTL", "0")
+    env = fakes.install(
+        firebase_latency=args.firebase_latency_ms / 1000,
+        fcm_latency=args.fcm_latency_ms / 1000,
+        emqx_latency=args.emqx_latency_ms / 1000,
+    )
+
+    # Keep per-message INFO logs from dominating the measurement
+    import logging
+    logging.disable(logging.INFO)
+
+    result = asyncio.run(run(args, env))
+    print_report(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+    return 0 if result["errors"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
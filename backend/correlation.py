@@ -0,0 +1,126 @@
+"""Correlate outbound tracker requests with the replies that come back over MQTT.
+
+The firmware does not echo an id, so each request is matched to the oldest
+outstanding request waiting on the same reply topic. Requests that are not
+answered within their timeout are dropped and counted as timeouts.
+"""
+import asyncio
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+# command -> topic label (see server.topic_label) of the reply it triggers
+REPLY_TOPICS = {
+    "get_status": "status",
+    "get_location": "location",
+    "get_contacts": "contacts",
+    "get_ledconfig": "led_config",
+    "get_config": "config",
+    "get_sms": "sms/stored",
+}
+
+
+def _accepts_status(payload: Any) -> bool:
+    # send_reason 1/2 are replies to a request; others are boot/periodic reports
+    return isinstance(payload, dict) and payload.get("send_reason") in (1, 2)
+
+
+# Optional filters so unsolicited messages on the same topic do not resolve a request
+REPLY_FILTERS: Dict[str, Callable[[Any], bool]] = {
+    "status": _accepts_status,
+}
+
+
+@dataclass
+class PendingRequest:
+    id: int
+    command: str
+    reply_topic: str
+    sent_at: float
+    deadline: float
+    future: asyncio.Future = field(repr=False)
+
+    def fail(self, error: Exception):
+        if not self.future.done():
+            self.future.set_exception(error)
+            # Mark it retrieved; listener-issued requests have nobody awaiting them
+            self.future.exception()
+
+    async def wait(self) -> Any:
+        """Reply payload, or asyncio.TimeoutError once the deadline passes"""
+        remaining = max(0.0, self.deadline - time.monotonic())
+        return await asyncio.wait_for(asyncio.shield(self.future), timeout=remaining)
+
+
+class CommandCorrelator:
+    def __init__(self, timeout: float = 120.0,
+                 on_reply: Optional[Callable[[PendingRequest, float], None]] = None,
+                 on_timeout: Optional[Callable[[PendingRequest], None]] = None):
+        self.timeout = timeout
+        self.on_reply = on_reply
+        self.on_timeout = on_timeout
+        self._ids = itertools.count(1)
+        self._pending: Dict[str, Deque[PendingRequest]] = {}
+
+    def register(self, command: str, timeout: Optional[float] = None) -> Optional[PendingRequest]:
+        """Start tracking a request; None if the command has no reply topic"""
+        reply_topic = REPLY_TOPICS.get(command)
+        if reply_topic is None:
+            return None
+        now = time.monotonic()
+        self.expire(now)
+        request = PendingRequest(
+            id=next(self._ids),
+            command=command,
+            reply_topic=reply_topic,
+            sent_at=now,
+            deadline=now + (timeout or self.timeout),
+            future=asyncio.get_running_loop().create_future(),
+        )
+        self._pending.setdefault(reply_topic, deque()).append(request)
+        return request
+
+    def resolve(self, topic: str, payload: Any) -> Optional[PendingRequest]:
+        """Hand an inbound message to the oldest request waiting on its topic"""
+        queue = self._pending.get(topic)
+        if not queue:
+            return None
+        accepts = REPLY_FILTERS.get(topic)
+        if accepts is not None and not accepts(payload):
+            return None
+
+        now = time.monotonic()
+        self.expire(now)
+        if not queue:
+            return None
+        request = queue.popleft()
+        if not request.future.done():
+            request.future.set_result(payload)
+        if self.on_reply:
+            self.on_reply(request, now - request.sent_at)
+        return request
+
+    def expire(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        for queue in self._pending.values():
+            while queue and queue[0].deadline <= now:
+                request = queue.popleft()
+                request.fail(asyncio.TimeoutError())
+                if self.on_timeout:
+                    self.on_timeout(request)
+
+    def cancel(self, request: PendingRequest):
+        """Stop waiting for a request whose publish never went out"""
+        queue = self._pending.get(request.reply_topic)
+        if queue and request in queue:
+            queue.remove(request)
+            request.fail(ConnectionError("request was not published"))
+
+    def outstanding(self) -> List[dict]:
+        now = time.monotonic()
+        return [
+            {"id": r.id, "command": r.command, "reply_topic": r.reply_topic, "age_s": round(now - r.sent_at, 1)}
+            for queue in self._pending.values() for r in queue
+        ]
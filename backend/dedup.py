@@ -0,0 +1,60 @@
+"""Bounded LRU/TTL set used to drop redelivered MQTT webhook messages."""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class DedupCache:
+    """Remembers recently seen keys; add() and discard() are O(1) amortized"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 120.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+
+    def _evict(self, now: float):
+        # Entries are kept in insertion order, so expired ones sit at the front
+        while self._seen:
+            key, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.ttl and len(self._seen) <= self.max_entries:
+                break
+            self._seen.popitem(last=False)
+
+    def seen(self, key: str, now: Optional[float] = None) -> bool:
+        """True if the key was added within the TTL"""
+        self._evict(time.monotonic() if now is None else now)
+        return key in self._seen
+
+    def add(self, key: str, now: Optional[float] = None) -> bool:
+        """Record a key; returns False if it was already seen within the TTL"""
+        now = time.monotonic() if now is None else now
+        self._evict(now)
+        if key in self._seen:
+            return False
+        self._seen[key] = now
+        return True
+
+    def discard(self, key: str):
+        """Forget a key, e.g. when handling it failed and a retry must go through"""
+        self._seen.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+def message_key(body: dict) -> str:
+    """Broker message id when EMQX sends one, otherwise a hash of topic and payload"""
+    msg_id = body.get("id")
+    if msg_id:
+        return f"id:{msg_id}"
+    payload: Any = body.get("payload")
+    if not isinstance(payload, (str, bytes)):
+        payload = repr(payload)
+    if isinstance(payload, str):
+        payload = payload.encode()
+    # The broker receive time tells a retry apart from a device sending the same text twice
+    received = str(body.get("publish_received_at") or body.get("timestamp") or "")
+    digest = hashlib.blake2b(
+        f"{body.get('topic', '')}\0{received}\0".encode() + payload, digest_size=16)
+    return f"h:{digest.hexdigest()}"
@@ -0,0 +1,48 @@
+"""Field-level diffs of tracker documents (contacts, ledconfig, deviceconfig).
+
+The tracker echoes each document back after applying it, so the last echo
+is what the device has. Pushes then only need the fields that differ from
+it, tagged with a per-document version number.
+"""
+from typing import Any, Dict, Optional
+
+# Fields that never go to the device
+IGNORED_FIELDS = ("timestamp", "version")
+
+
+def _clean(doc: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in doc.items() if k not in IGNORED_FIELDS}
+
+
+class DocumentSync:
+    def __init__(self):
+        self.acked: Dict[str, Dict[str, Any]] = {}
+        self.versions: Dict[str, int] = {}
+
+    def acknowledge(self, kind: str, doc: Dict[str, Any]) -> bool:
+        """Record the document the device reported; returns True if it changed"""
+        doc = _clean(doc)
+        if self.acked.get(kind) == doc:
+            return False
+        self.acked[kind] = doc
+        return True
+
+    def has_baseline(self, kind: str) -> bool:
+        return kind in self.acked
+
+    def diff(self, kind: str, desired: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Fields of desired that differ from the device copy; None without a baseline"""
+        acked = self.acked.get(kind)
+        if acked is None:
+            return None
+        return {k: v for k, v in _clean(desired).items() if acked.get(k) != v}
+
+    def next_version(self, kind: str) -> int:
+        self.versions[kind] = self.versions.get(kind, 0) + 1
+        return self.versions[kind]
+
+    def load(self, kind: str, state: Dict[str, Any]):
+        """Restore a baseline persisted as {"doc": ..., "version": n}"""
+        if isinstance(state.get("doc"), dict):
+            self.acked[kind] = _clean(state["doc"])
+        self.versions[kind] = max(self.versions.get(kind, 0), int(state.get("version", 0)))
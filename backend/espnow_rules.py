@@ -0,0 +1,144 @@
+"""Rule engine for the ESP-NOW message stream.
+
+Rules are loaded from JSON (see espnow_rules.json). Keyword rules share one
+precompiled alternation so a message is scanned once for all of them; regex
+rules are compiled individually. Each rule keeps a sliding-window counter
+per sender and only fires when the count reaches its threshold and the
+rule's cooldown for that sender has passed. Repeats of the same message
+from the same sender are collapsed into one stored entry.
+"""
+import json
+import re
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Tuple
+
+DEFAULT_RULES = {
+    "sender_pattern": r"^\s*(?P<sender>[^:]{1,32}):",
+    "aggregate_window": 300,
+    "rules": [
+        {"name": "important", "keywords": ["IMPORTANT", "DETECTED"], "priority": "high_priority", "cooldown": 300},
+    ],
+}
+
+# Bound on remembered (rule, sender) windows and collapsed messages
+MAX_TRACKED = 1000
+
+
+@dataclass
+class Rule:
+    name: str
+    priority: str = "general"
+    keywords: List[str] = field(default_factory=list)
+    pattern: Optional[str] = None
+    window: float = 60.0       # seconds the threshold is counted over
+    threshold: int = 1         # matches within window needed to fire
+    cooldown: float = 0.0      # seconds before the rule can fire again for a sender
+    compiled: Optional[re.Pattern] = field(default=None, repr=False)
+
+
+@dataclass
+class Trigger:
+    rule: Rule
+    sender: str
+    count: int
+
+
+@dataclass
+class Collapsed:
+    key: str
+    count: int
+    first_seen: float
+
+
+class EspNowRuleEngine:
+    def __init__(self, config: Optional[dict] = None):
+        self.load(config or DEFAULT_RULES)
+
+    def load(self, config: dict):
+        """(Re)build matchers from a rules config; resets counters"""
+        self.sender_re = re.compile(config.get("sender_pattern", DEFAULT_RULES["sender_pattern"]))
+        self.aggregate_window = float(config.get("aggregate_window", 300))
+        self.rules: List[Rule] = []
+        keyword_rules: Dict[str, List[Rule]] = {}
+
+        for spec in config.get("rules", []):
+            rule = Rule(**{k: v for k, v in spec.items() if k in Rule.__dataclass_fields__ and k != "compiled"})
+            if rule.pattern:
+                rule.compiled = re.compile(rule.pattern)
+            for kw in rule.keywords:
+                keyword_rules.setdefault(kw, []).append(rule)
+            self.rules.append(rule)
+
+        # Longest first so overlapping keywords prefer the more specific one
+        keywords = sorted(keyword_rules, key=len, reverse=True)
+        self.keyword_re = re.compile("|".join(re.escape(k) for k in keywords)) if keywords else None
+        self.keyword_rules = keyword_rules
+
+        self._hits: "OrderedDict[Tuple[str, str], Deque[float]]" = OrderedDict()
+        self._last_fired: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._recent: "OrderedDict[Tuple[str, str], Collapsed]" = OrderedDict()
+
+    @classmethod
+    def from_file(cls, path: str) -> "EspNowRuleEngine":
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def sender_of(self, message: str) -> str:
+        m = self.sender_re.search(message)
+        return m.group("sender").strip() if m else "unknown"
+
+    def matching_rules(self, message: str) -> List[Rule]:
+        matched: List[Rule] = []
+        if self.keyword_re is not None:
+            for kw in set(self.keyword_re.findall(message)):
+                for rule in self.keyword_rules[kw]:
+                    if rule not in matched:
+                        matched.append(rule)
+        for rule in self.rules:
+            if rule.compiled is not None and rule not in matched and rule.compiled.search(message):
+                matched.append(rule)
+        return matched
+
+    @staticmethod
+    def _bounded_set(store: OrderedDict, key, value):
+        store[key] = value
+        store.move_to_end(key)
+        if len(store) > MAX_TRACKED:
+            store.popitem(last=False)
+
+    def evaluate(self, message: str, now: float) -> Tuple[str, List[Trigger]]:
+        """Count the message against every matching rule; return the rules that fire"""
+        sender = self.sender_of(message)
+        triggers = []
+        for rule in self.matching_rules(message):
+            key = (rule.name, sender)
+            hits = self._hits.get(key)
+            if hits is None:
+                hits = deque()
+            hits.append(now)
+            while hits and now - hits[0] > rule.window:
+                hits.popleft()
+            self._bounded_set(self._hits, key, hits)
+
+            if len(hits) < rule.threshold:
+                continue
+            last = self._last_fired.get(key)
+            if last is not None and now - last < rule.cooldown:
+                continue
+            self._bounded_set(self._last_fired, key, now)
+            triggers.append(Trigger(rule, sender, len(hits)))
+        return sender, triggers
+
+    def repeat_of(self, sender: str, message: str, now: float) -> Optional[Collapsed]:
+        """The stored entry this message repeats, if it arrived within the aggregate window.
+
+        The count is left alone; bump it once the repeat has been stored.
+        """
+        entry = self._recent.get((sender, message))
+        if entry is None or now - entry.first_seen > self.aggregate_window:
+            return None
+        return entry
+
+    def remember(self, sender: str, message: str, key: str, now: float):
+        self._bounded_set(self._recent, (sender, message), Collapsed(key, 1, now))
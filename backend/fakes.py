@@ -0,0 +1,225 @@
+"""In-process stand-ins for Firebase RTDB, FCM and the EMQX HTTP API.
+
+Used by the benchmark and replay tools so server.py can run without
+credentials or network access. Call install() before importing server.
+"""
+import os
+import json
+import time
+import itertools
+import threading
+from typing import Any, Dict, List, Optional
+
+
+def _split(path: str) -> List[str]:
+    return [p for p in path.strip("/").split("/") if p]
+
+
+#---------------------------------------------------------------------------
+class FakeDatabase:
+    """Nested-dict tree mimicking the subset of firebase_admin.db used by server.py"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.root: Dict[str, Any] = {}
+        self.calls = 0
+        self.listeners: List[tuple] = []
+        self._lock = threading.Lock()
+        self._push_ids = itertools.count()
+
+    def _wait(self):
+        self.calls += 1
+        if self.latency:
+            # The real SDK blocks the calling thread, so do the same here
+            time.sleep(self.latency)
+
+    def _get(self, parts: List[str]):
+        node = self.root
+        for p in parts:
+            if not isinstance(node, dict) or p not in node:
+                return None
+            node = node[p]
+        return node
+
+    def _set(self, parts: List[str], value: Any):
+        if not parts:
+            self.root = value if isinstance(value, dict) else {}
+            return
+        node = self.root
+        for p in parts[:-1]:
+            if not isinstance(node.get(p), dict):
+                node[p] = {}
+            node = node[p]
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = value
+
+    def reference(self, path: str = "/", app=None, url=None) -> "FakeReference":
+        return FakeReference(self, _split(path))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return json.loads(json.dumps(self.root, default=str))
+
+
+class FakeReference:
+    def __init__(self, database: FakeDatabase, parts: List[str]):
+        self._db = database
+        self._parts = parts
+
+    @property
+    def key(self) -> Optional[str]:
+        return self._parts[-1] if self._parts else None
+
+    @property
+    def path(self) -> str:
+        return "/" + "/".join(self._parts)
+
+    def child(self, path: str) -> "FakeReference":
+        return FakeReference(self._db, self._parts + _split(path))
+
+    def get(self, *args, **kwargs):
+        self._db._wait()
+        with self._db._lock:
+            value = self._db._get(self._parts)
+            return json.loads(json.dumps(value)) if value is not None else None
+
+    def set(self, value):
+        self._db._wait()
+        with self._db._lock:
+            self._db._set(self._parts, json.loads(json.dumps(value)))
+
+    def update(self, value):
+        if not isinstance(value, dict) or not value:
+            raise ValueError("Value argument must be a non-empty dictionary.")
+        self._db._wait()
+        with self._db._lock:
+            for k, v in json.loads(json.dumps(value)).items():
+                self._db._set(self._parts + _split(k), v)
+
+    def push(self, value=""):
+        self._db._wait()
+        # Zero padded counter keeps push keys ordered like Firebase's
+        key = f"-fake{next(self._db._push_ids):012d}"
+        with self._db._lock:
+            self._db._set(self._parts + [key], json.loads(json.dumps(value)))
+        return FakeReference(self._db, self._parts + [key])
+
+    def transaction(self, transaction_update):
+        self._db._wait()
+        with self._db._lock:
+            current = self._db._get(self._parts)
+            current = json.loads(json.dumps(current)) if current is not None else None
+            value = transaction_update(current)
+            self._db._set(self._parts, json.loads(json.dumps(value)) if value is not None else None)
+            return value
+
+    def delete(self):
+        self._db._wait()
+        with self._db._lock:
+            self._db._set(self._parts, None)
+
+    def listen(self, callback):
+        entry = (self.path, callback)
+        self._db.listeners.append(entry)
+        return FakeListenerRegistration(self._db, entry)
+
+
+class FakeListenerRegistration:
+    def __init__(self, database: FakeDatabase, entry: tuple):
+        self._db = database
+        self._entry = entry
+
+    def close(self):
+        if self._entry in self._db.listeners:
+            self._db.listeners.remove(self._entry)
+
+
+#---------------------------------------------------------------------------
+class FakeMessaging:
+    """Records FCM messages instead of sending them"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent: List[Any] = []
+
+    def send(self, message, dry_run=False, app=None) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        self.sent.append(message)
+        return f"projects/fake/messages/{len(self.sent)}"
+
+
+#---------------------------------------------------------------------------
+class FakeResponse:
+    def __init__(self, status_code: int = 200, payload: Any = None):
+        self.status_code = status_code
+        self._payload = payload if payload is not None else {}
+        self.text = json.dumps(self._payload)
+
+    def json(self):
+        return self._payload
+
+
+class FakeEMQX:
+    """Answers the EMQX HTTP API endpoints server.py calls"""
+
+    def __init__(self, latency: float = 0.0, clients: Optional[List[str]] = None):
+        self.latency = latency
+        self.clients = clients if clients is not None else ["Tracker-fake"]
+        self.published: List[dict] = []
+
+    def post(self, url: str, json: Any = None, **kwargs) -> FakeResponse:
+        if self.latency:
+            time.sleep(self.latency)
+        if url.endswith("/publish"):
+            self.published.append(json)
+        return FakeResponse(200, {"id": str(len(self.published))})
+
+    def get(self, url: str, **kwargs) -> FakeResponse:
+        if self.latency:
+            time.sleep(self.latency)
+        if "/clients" in url:
+            return FakeResponse(200, {"data": [{"clientid": c} for c in self.clients]})
+        return FakeResponse(404, {"message": "not found"})
+
+
+#---------------------------------------------------------------------------
+class FakeEnvironment:
+    def __init__(self, database: FakeDatabase, messaging: FakeMessaging, emqx: FakeEMQX):
+        self.database = database
+        self.messaging = messaging
+        self.emqx = emqx
+
+
+def install(
+    firebase_latency: float = 0.0,
+    fcm_latency: float = 0.0,
+    emqx_latency: float = 0.0,
+) -> FakeEnvironment:
+    """Patch firebase_admin and requests so server.py talks to in-process fakes"""
+    import requests
+    import firebase_admin
+    from firebase_admin import credentials, db, messaging
+
+    env = FakeEnvironment(
+        FakeDatabase(firebase_latency),
+        FakeMessaging(fcm_latency),
+        FakeEMQX(emqx_latency),
+    )
+
+    os.environ.setdefault("FIREBASE_ADMIN_SDK_JSON", "{}")
+    os.environ.setdefault("FIREBASE_DATABASE_URL", "https://fake.firebaseio.com")
+    os.environ.setdefault("EMQX_API_URL", "http://emqx.fake/api/v5")
+    os.environ.setdefault("EMQX_API_KEY", "fake")
+    os.environ.setdefault("EMQX_SECRET_KEY", "fake")
+
+    credentials.Certificate = lambda *args, **kwargs: None
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    db.reference = env.database.reference
+    messaging.send = env.messaging.send
+    requests.post = env.emqx.post
+    requests.get = env.emqx.get
+
+    return env
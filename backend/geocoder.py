@@ -0,0 +1,147 @@
+"""Offline reverse geocoding from a local gazetteer.
+
+Places are read from a GeoNames dump (cities15000.txt or cities1000.txt,
+plain or as the downloaded .zip) or a simple "name,lat,lon[,country]" CSV,
+and indexed on a fixed lat/lon grid. A lookup only scans the grid cells
+within max_km of the point. Results are kept in an LRU cache keyed
+by the coordinate rounded to ~100 m, so a tracker reporting from the same
+spot does not search again.
+"""
+import csv
+import io
+import zipfile
+from collections import OrderedDict
+from dataclasses import dataclass
+from math import asin, ceil, cos, floor, radians, sin, sqrt
+from typing import Dict, Iterable, List, Optional, Tuple
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.2
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    lat: float
+    lon: float
+    country: str = ""
+    admin1: str = ""
+    population: int = 0
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}, {self.country}" if self.country else self.name
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    d_lat = radians(lat2 - lat1)
+    d_lon = radians(lon2 - lon1)
+    a = sin(d_lat / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(d_lon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+
+def _geonames_rows(lines: Iterable[str]) -> Iterable[Place]:
+    # geonameid, name, asciiname, alternatenames, lat, lon, feature class,
+    # feature code, country code, cc2, admin1 code, admin2..4, population, ...
+    for line in lines:
+        cols = line.rstrip("\n").split("\t")
+        if len(cols) < 15:
+            continue
+        try:
+            yield Place(cols[1], float(cols[4]), float(cols[5]), cols[8], cols[10], int(cols[14] or 0))
+        except ValueError:
+            continue
+
+
+def _csv_rows(lines: Iterable[str]) -> Iterable[Place]:
+    for row in csv.reader(lines):
+        if len(row) < 3 or row[0].startswith("#"):
+            continue
+        try:
+            yield Place(row[0].strip(), float(row[1]), float(row[2]), row[3].strip() if len(row) > 3 else "")
+        except ValueError:
+            continue  # header line
+
+
+def read_gazetteer(path: str) -> List[Place]:
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            member = next(n for n in archive.namelist() if n.endswith(".txt") and "readme" not in n.lower())
+            with archive.open(member) as raw:
+                return list(_geonames_rows(io.TextIOWrapper(raw, encoding="utf-8")))
+    with open(path, encoding="utf-8") as f:
+        lines = list(f)
+    tab_separated = bool(lines) and lines[0].count("\t") >= 14
+    return list(_geonames_rows(lines) if tab_separated else _csv_rows(lines))
+
+
+class Gazetteer:
+    def __init__(self, places: Iterable[Place], cell_degrees: float = 0.25):
+        self.cell = cell_degrees
+        self.lon_cells_total = round(360 / cell_degrees)
+        self.cells: Dict[Tuple[int, int], List[Place]] = {}
+        self.size = 0
+        for place in places:
+            self.cells.setdefault(self._cell_of(place.lat, place.lon), []).append(place)
+            self.size += 1
+
+    def _cell_of(self, lat: float, lon: float) -> Tuple[int, int]:
+        return floor(lat / self.cell), floor(lon / self.cell)
+
+    def nearest(self, lat: float, lon: float, max_km: float) -> Optional[Tuple[Place, float]]:
+        """Closest place within max_km of the point, with its distance in km"""
+        ci, cj = self._cell_of(lat, lon)
+        lat_cells = ceil(max_km / KM_PER_DEGREE / self.cell)
+        # Degrees of longitude shrink towards the poles, so widen the search
+        lon_scale = max(cos(radians(min(abs(lat) + lat_cells * self.cell, 89.9))), 1e-3)
+        lon_cells = min(ceil(max_km / (KM_PER_DEGREE * lon_scale) / self.cell), self.lon_cells_total // 2)
+        half = self.lon_cells_total // 2
+
+        best, best_km = None, max_km
+        for i in range(ci - lat_cells, ci + lat_cells + 1):
+            for j in range(cj - lon_cells, cj + lon_cells + 1):
+                # Wrap across the antimeridian
+                bucket = self.cells.get((i, (j + half) % self.lon_cells_total - half))
+                if not bucket:
+                    continue
+                for place in bucket:
+                    d = distance_km(lat, lon, place.lat, place.lon)
+                    if d < best_km or (d == best_km and best is not None and place.population > best.population):
+                        best, best_km = place, d
+        return (best, best_km) if best is not None else None
+
+
+class ReverseGeocoder:
+    def __init__(self, gazetteer: Gazetteer, max_km: float = 25.0, precision: int = 3, cache_size: int = 4096):
+        self.gazetteer = gazetteer
+        self.max_km = max_km
+        self.precision = precision  # decimal places; 3 is ~110 m
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[float, float], Optional[dict]]" = OrderedDict()
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "ReverseGeocoder":
+        return cls(Gazetteer(read_gazetteer(path)), **kwargs)
+
+    def lookup(self, lat: float, lon: float) -> Optional[dict]:
+        """Nearest place to a coordinate as {"name", "country", "admin1", "label", "distance_km"}"""
+        key = (round(lat, self.precision), round(lon, self.precision))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        found = self.gazetteer.nearest(key[0], key[1], self.max_km)
+        result = None
+        if found is not None:
+            place, km = found
+            result = {
+                "name": place.name,
+                "country": place.country,
+                "admin1": place.admin1,
+                "label": place.label,
+                "distance_km": round(km, 2),
+            }
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
@@ -0,0 +1,132 @@
+"""Leader election so only one instance owns the Firebase listeners.
+
+Two lease backends:
+- FileLease: an exclusive flock on a local file. For several uvicorn
+  workers on one host; the OS drops the lock if the holder dies.
+- FirebaseLease: an {owner, expires} record updated in a transaction. For
+  replicas on different hosts; a holder that stops renewing loses it after
+  the TTL.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+
+def instance_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class FileLease:
+    def __init__(self, path: str):
+        if fcntl is None:
+            raise RuntimeError("File leases need fcntl (POSIX only)")
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def acquire(self) -> bool:
+        """Take or keep the lock without blocking; True while held"""
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+class FirebaseLease:
+    def __init__(self, reference_factory: Callable, path: str, ttl: float = 30.0, owner: Optional[str] = None):
+        self.reference_factory = reference_factory
+        self.path = path
+        self.ttl = ttl
+        self.owner = owner or instance_id()
+
+    def acquire(self) -> bool:
+        """Claim the lease if it is free, expired or already ours; renews it if ours"""
+        now = time.time()
+
+        def claim(current):
+            held_by_other = isinstance(current, dict) and current.get("owner") != self.owner
+            if held_by_other and current.get("expires", 0) > now:
+                return current
+            return {"owner": self.owner, "expires": now + self.ttl}
+
+        result = self.reference_factory(self.path).transaction(claim)
+        return isinstance(result, dict) and result.get("owner") == self.owner
+
+    def release(self):
+        def drop(current):
+            if isinstance(current, dict) and current.get("owner") == self.owner:
+                return None
+            return current
+
+        try:
+            self.reference_factory(self.path).transaction(drop)
+        except Exception as e:
+            logger.error(f"Error releasing leader lease: {str(e)}")
+
+
+class LeaderElector:
+    """Keeps trying to hold a lease and runs callbacks when leadership changes"""
+
+    def __init__(self, lease, interval: float, on_elected: Callable[[], None], on_demoted: Callable[[], None]):
+        self.lease = lease
+        self.interval = interval
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_leader = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            try:
+                held = await asyncio.to_thread(self.lease.acquire)
+            except Exception as e:
+                logger.error(f"Error renewing leader lease: {str(e)}")
+                held = False
+
+            if held and not self.is_leader:
+                self.is_leader = True
+                logger.info("Elected leader, taking over listeners")
+                await asyncio.to_thread(self.on_elected)
+            elif not held and self.is_leader:
+                self.is_leader = False
+                logger.warning("Lost leadership, releasing listeners")
+                await asyncio.to_thread(self.on_demoted)
+
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self.is_leader:
+            self.is_leader = False
+            await asyncio.to_thread(self.on_demoted)
+        await asyncio.to_thread(self.lease.release)
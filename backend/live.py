@@ -0,0 +1,76 @@
+"""Server-sent event fan-out of the latest tracker state.
+
+Each subscriber keeps at most one pending update per kind (status,
+location, callstatus). A newer update replaces a stale one that has not
+been delivered yet, so a slow client costs O(kinds) memory and always
+receives the freshest state instead of a growing backlog.
+"""
+import asyncio
+import json
+from typing import Dict, Iterable, Optional, Set
+
+
+class Subscriber:
+    def __init__(self, kinds: Optional[Iterable[str]] = None):
+        self.kinds = set(kinds) if kinds else None
+        self.pending: Dict[str, dict] = {}
+        self.event = asyncio.Event()
+        self.coalesced = 0
+
+    def offer(self, kind: str, data: dict) -> bool:
+        """Queue an update; returns True if it replaced an undelivered one"""
+        if self.kinds is not None and kind not in self.kinds:
+            return False
+        replaced = kind in self.pending
+        self.pending[kind] = data
+        if replaced:
+            self.coalesced += 1
+        self.event.set()
+        return replaced
+
+    def take(self) -> Dict[str, dict]:
+        items, self.pending = self.pending, {}
+        self.event.clear()
+        return items
+
+
+class LiveBroadcaster:
+    def __init__(self):
+        self.subscribers: Set[Subscriber] = set()
+        self.latest: Dict[str, dict] = {}
+        self.coalesced = 0
+
+    def subscribe(self, kinds: Optional[Iterable[str]] = None) -> Subscriber:
+        sub = Subscriber(kinds)
+        # Start every client from the current state
+        for kind, data in self.latest.items():
+            sub.offer(kind, data)
+        self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self.subscribers.discard(sub)
+
+    def publish(self, kind: str, data: dict):
+        """Hand an update to every subscriber; never blocks on slow clients"""
+        self.latest[kind] = data
+        for sub in self.subscribers:
+            if sub.offer(kind, data):
+                self.coalesced += 1
+
+    async def stream(self, sub: Subscriber, is_disconnected, keepalive: float = 15.0):
+        """Yield SSE frames for one subscriber until the client goes away"""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    await asyncio.wait_for(sub.event.wait(), timeout=keepalive)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                for kind, data in sub.take().items():
+                    yield f"event: {kind}\ndata: {json.dumps(data, default=str)}\n\n"
+        finally:
+            self.unsubscribe(sub)
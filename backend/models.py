@@ -95,6 +95,7 @@ class Contacts(BaseModel):
 class SmsMessage(BaseModel):
     number: str
     message: str
+    index: Optional[int] = None
     time_sent: Optional[str] = None
     time_sent_human: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
@@ -0,0 +1,96 @@
+"""Durable local outbox for MQTT webhook bodies.
+
+Webhooks append the raw body here and return immediately; a drainer in
+server.py applies them to Firebase later. Backed by SQLite in WAL mode so
+appends are cheap and survive a process restart.
+"""
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+@dataclass
+class OutboxRecord:
+    id: int
+    key: str
+    body: dict
+    received_at: float
+    attempts: int
+
+
+class Outbox:
+    def __init__(self, path: str, synchronous: str = "NORMAL"):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL survives process crashes; FULL also survives power loss
+        self.conn.execute(f"PRAGMA synchronous={synchronous}")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL UNIQUE,
+                body TEXT NOT NULL,
+                received_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                dead INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (dead, id)")
+        # Kept in memory so appends never pay for a COUNT over a large backlog
+        self._depth = 0
+        self._dead = 0
+        self.refresh()
+
+    def refresh(self):
+        """Recount from the file, picking up rows other processes appended or applied"""
+        counts = dict(self.conn.execute("SELECT dead, COUNT(*) FROM outbox GROUP BY dead").fetchall())
+        self._depth = counts.get(0, 0)
+        self._dead = counts.get(1, 0)
+
+    def append(self, key: str, body: dict, received_at: Optional[float] = None) -> bool:
+        """Store a message; returns False if the key was already queued"""
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO outbox (key, body, received_at) VALUES (?, ?, ?)",
+            (key, json.dumps(body), received_at or time.time()),
+        )
+        if cur.rowcount:
+            self._depth += 1
+        return bool(cur.rowcount)
+
+    def fetch(self, limit: int = 50) -> List[OutboxRecord]:
+        rows = self.conn.execute(
+            "SELECT id, key, body, received_at, attempts FROM outbox WHERE dead = 0 ORDER BY id LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [OutboxRecord(r[0], r[1], json.loads(r[2]), r[3], r[4]) for r in rows]
+
+    def ack(self, ids: List[int]):
+        """Remove applied messages in one transaction"""
+        if not ids:
+            return
+        self.conn.execute("BEGIN")
+        self.conn.executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+        self.conn.execute("COMMIT")
+
+    def fail(self, id: int, error: str, dead: bool = False):
+        self.conn.execute(
+            "UPDATE outbox SET attempts = attempts + 1, last_error = ?, dead = ? WHERE id = ?",
+            (error[:500], int(dead), id),
+        )
+        if dead:
+            self._depth = max(0, self._depth - 1)
+            self._dead += 1
+
+    def depth(self) -> int:
+        """Messages waiting to be applied, as of the last refresh plus appends since"""
+        return self._depth
+
+    def dead_letters(self) -> int:
+        """Messages given up on, kept for inspection"""
+        return self._dead
+
+    def close(self):
+        self.conn.close()
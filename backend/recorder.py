@@ -0,0 +1,96 @@
+"""Capture of /api/webhook/mqtt traffic for offline replay.
+
+Each webhook body is written as one gzip-compressed JSON line,
+{"t": <unix receive time>, "body": <webhook body>}. Writes happen on a
+background thread so recording never blocks the event loop; the handler
+only enqueues the body. Every process starts its own file, and a file cut
+short by a crash is read up to its last complete line.
+"""
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Iterator, Optional, Tuple
+
+# Flush the gzip stream at least this often so a crash loses little traffic
+FLUSH_INTERVAL = 5.0
+
+
+def recording_path(path: str) -> str:
+    """mqtt.jsonl.gz -> mqtt-20240512T103300Z-1234.jsonl.gz, unique per process"""
+    directory, name = os.path.split(path)
+    stem, dot, ext = name.partition(".")
+    started = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return os.path.join(directory, f"{stem}-{started}-{os.getpid()}{dot}{ext}")
+
+
+class TrafficRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self.recorded = 0
+        self._queue: "queue.SimpleQueue[Optional[Tuple[float, dict]]]" = queue.SimpleQueue()
+        self._file = gzip.open(path, "xt", encoding="utf-8")
+        self._thread = threading.Thread(target=self._write, name="traffic-recorder", daemon=True)
+        self._thread.start()
+
+    def record(self, body: dict, received_at: Optional[float] = None):
+        self._queue.put((time.time() if received_at is None else received_at, body))
+
+    def _write(self):
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                t, body = item
+                self._file.write(json.dumps({"t": round(t, 3), "body": body}, separators=(",", ":")) + "\n")
+                self.recorded += 1
+            if time.monotonic() - last_flush >= FLUSH_INTERVAL:
+                self._file.flush()
+                last_flush = time.monotonic()
+        self._file.close()
+
+    def close(self):
+        """Write out everything queued so far and close the file"""
+        self._queue.put(None)
+        self._thread.join()
+
+
+def read_recording(path: str) -> Iterator[Tuple[Optional[float], dict]]:
+    """Yield (receive time, body) pairs from a recording.
+
+    Plain JSONL files of bare webhook bodies (the bench_ingest replay
+    format) are accepted too; their receive time is None.
+    """
+    with open(path, "rb") as f:
+        compressed = f.read(2) == b"\x1f\x8b"
+    opener = gzip.open if compressed else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        while True:
+            try:
+                line = f.readline()
+            except (EOFError, zlib.error, gzip.BadGzipFile):
+                # The writer died before closing the file; keep what was flushed
+                return
+            if not line:
+                return
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                if not line.endswith("\n"):
+                    return  # partial last line
+                raise
+            if isinstance(entry, dict) and "body" in entry and "t" in entry:
+                yield entry["t"], entry["body"]
+            else:
+                yield None, entry
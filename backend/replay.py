@@ -0,0 +1,200 @@
+"""Replay recorded MQTT webhook traffic against in-process fakes.
+
+Record in production with MQTT_RECORD_PATH=mqtt.jsonl.gz (each process
+writes mqtt-<start>-<pid>.jsonl.gz), then:
+    python replay.py mqtt-*.jsonl.gz --output replay.json
+    python replay.py mqtt-*.jsonl.gz --speed 60 --max-gap 300 --state firebase_export.json
+
+Each message is handled with its recorded receive time as the message
+time, so timestamps, cooldowns and rate estimates come out as they would
+have in production, however fast the replay runs. With --speed 0
+(default) messages are sent back to back in order; otherwise they keep
+their recorded spacing divided by the speed.
+
+The output holds the final database, the notifications sent and the
+messages published to the tracker, with keys sorted so two runs can be
+compared with diff.
+
+Needs httpx on top of the server requirements: pip install -r requirements-dev.txt
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+import fakes
+from recorder import read_recording
+
+# Nodes written from the wall clock rather than from the replayed traffic
+DEFAULT_EXCLUDE = "Backend,Tracker/MQTT/last_connected"
+
+DEFAULT_STATE = {
+    "Preferences": {"tracker_autowake": False},
+    "PushTokens": {"default_user": {"token": "replay-token"}},
+    "Tracker": {"location": {"latest": {"gps_lat": 0.0, "gps_lon": 0.0, "lbs_lat": 0.0, "lbs_lon": 0.0}}},
+}
+
+
+def load_messages(paths: List[str]) -> List[Tuple[float, dict]]:
+    messages = []
+    for path in paths:
+        for index, (t, body) in enumerate(read_recording(path)):
+            # Bare bodies carry no timing; space them one second apart
+            messages.append((float(index) if t is None else t, body))
+    # Files from several processes interleave by receive time
+    messages.sort(key=lambda m: m[0])
+    return messages
+
+
+def schedule(messages: List[Tuple[float, dict]], speed: float, max_gap: Optional[float]) -> List[float]:
+    """Offsets in seconds from the start of the replay at which to send each message"""
+    offsets = []
+    elapsed = 0.0
+    previous = messages[0][0] if messages else 0.0
+    for t, _ in messages:
+        gap = max(0.0, t - previous)
+        if max_gap is not None:
+            gap = min(gap, max_gap)
+        elapsed += gap
+        previous = t
+        offsets.append(elapsed / speed if speed > 0 else 0.0)
+    return offsets
+
+
+def describe_message(message) -> dict:
+    notification = getattr(message, "notification", None)
+    android = getattr(message, "android", None)
+    channel = getattr(getattr(android, "notification", None), "channel_id", None)
+    return {
+        "title": getattr(notification, "title", None),
+        "body": getattr(notification, "body", None),
+        "channel": channel,
+        "token": getattr(message, "token", None),
+        "topic": getattr(message, "topic", None),
+        "data": getattr(message, "data", None),
+    }
+
+
+def prune(tree: dict, paths: List[str]) -> dict:
+    for path in paths:
+        parts = [p for p in path.strip("/").split("/") if p]
+        node = tree
+        for p in parts[:-1]:
+            node = node.get(p) if isinstance(node, dict) else None
+        if isinstance(node, dict) and parts:
+            node.pop(parts[-1], None)
+    return tree
+
+
+async def run(args, env) -> dict:
+    import httpx
+    import server
+
+    messages = load_messages(args.recordings)
+    offsets = schedule(messages, args.speed, args.max_gap)
+
+    root = env.database.reference("/")
+    if args.state:
+        with open(args.state) as f:
+            root.set(json.load(f))
+    else:
+        root.set(DEFAULT_STATE)
+
+    await server.app.router.startup()
+    # Let the startup writes land first so they do not race the first messages
+    await asyncio.gather(*server.background_startup, return_exceptions=True)
+
+    errors = []
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+        async def send(index: int, t: float, body: dict):
+            # The in-memory transport runs the app in this task, so the
+            # handlers see this context and use the recorded receive time
+            token = server.message_context.set({
+                "key": f"{int(t * 1000):013d}-{index}",
+                "received_at": datetime.fromtimestamp(t, timezone.utc),
+                "pushes": 0,
+            })
+            try:
+                response = await client.post("/api/webhook/mqtt", json=body)
+                if response.status_code != 200:
+                    errors.append({"index": index, "topic": body.get("topic"), "status": response.status_code})
+            finally:
+                server.message_context.reset(token)
+
+        started = time.perf_counter()
+        if args.speed > 0:
+            tasks = []
+            for index, ((t, body), offset) in enumerate(zip(messages, offsets)):
+                delay = offset - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                tasks.append(asyncio.create_task(send(index, t, body)))
+            await asyncio.gather(*tasks)
+        else:
+            for index, (t, body) in enumerate(messages):
+                await send(index, t, body)
+        elapsed = time.perf_counter() - started
+
+    await server.app.router.shutdown()
+
+    span = messages[-1][0] - messages[0][0] if messages else 0.0
+    return {
+        "summary": {
+            "messages": len(messages),
+            "errors": len(errors),
+            "recorded_span_s": round(span, 3),
+            "firebase_calls": env.database.calls,
+            "emqx_publishes": len(env.emqx.published),
+            "fcm_sends": len(env.messaging.sent),
+        },
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "database": prune(env.database.snapshot(), [p for p in args.exclude.split(",") if p]),
+        "notifications": [describe_message(m) for m in env.messaging.sent],
+        "published": env.emqx.published,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recordings", nargs="+", help="gzip JSONL captures from MQTT_RECORD_PATH, or bare bodies as JSONL")
+    parser.add_argument("--speed", type=float, default=0.0, help="time acceleration factor, 0 = back to back")
+    parser.add_argument("--max-gap", type=float, help="cap idle gaps to this many recorded seconds")
+    parser.add_argument("--state", help="JSON export of the database to start from")
+    parser.add_argument("--exclude", default=DEFAULT_EXCLUDE, help="comma separated paths left out of the output")
+    parser.add_argument("--output", default="-", help="where to write the result (default stdout)")
+    args = parser.parse_args(argv)
+
+    # Replay against local stand-ins only, handling each message inline
+    os.environ.pop("MQTT_RECORD_PATH", None)
+    os.environ["INGEST_MODE"] = "direct"
+    os.environ["LEADER_ELECTION"] = "off"
+    env = fakes.install()
+
+    import logging
+    logging.disable(logging.INFO)
+
+    result = asyncio.run(run(args, env))
+    # Wall time varies run to run; report it but keep it out of the diffable output
+    elapsed = result.pop("elapsed_s")
+
+    text = json.dumps(result, indent=2, sort_keys=True, default=str)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        summary = result["summary"]
+        print(f"replayed {summary['messages']} messages ({summary['errors']} errors) "
+              f"spanning {summary['recorded_span_s']} s in {elapsed} s -> {args.output}")
+
+    return 0 if not result["errors"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Adaptive wake/report interval scheduling for the tracker.
+
+Learns an hour-of-day movement profile from location fixes and combines it
+with the latest battery level to pick prd_wakeup_time (minutes between
+periodic wake ups) and prd_mqtt_intvrl (report location every N wake ups).
+All updates are O(1); server.py pushes the result through set_config.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from math import ceil, radians, sin, cos, sqrt, atan2
+from typing import List, Optional
+
+
+def _distance(lat1, lon1, lat2, lon2) -> float:
+    R = 6371000
+    d_phi = radians(lat2 - lat1)
+    d_lambda = radians(lon2 - lon1)
+    a = sin(d_phi / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(d_lambda / 2) ** 2
+    return R * 2 * atan2(sqrt(a), sqrt(1 - a))
+
+
+@dataclass
+class SchedulerSettings:
+    min_wake: int = 5              # minutes, fastest wake interval when moving
+    max_wake: int = 240            # minutes, slowest wake interval when stationary
+    stationary_report: int = 360   # minutes between location reports when stationary
+    move_threshold: float = 150.0  # metres between fixes that count as movement
+    recent_movement: int = 60      # minutes a movement keeps the fast schedule
+    low_battery: int = 20          # percent, wake interval doubles below this
+    critical_battery: int = 10     # percent, wake interval quadruples below this
+    learning_rate: float = 0.2     # EWMA weight of a new fix in the hourly profile
+    min_samples: int = 48          # fixes to learn from before changing the device config
+    wake_cost_mah: float = 0.6     # estimated charge per periodic wake up
+    report_cost_mah: float = 2.5   # estimated extra charge per MQTT location report
+
+
+@dataclass
+class Plan:
+    prd_wakeup_time: int
+    prd_mqtt_intvrl: int
+
+    def wakes_per_day(self) -> float:
+        return 1440 / max(1, self.prd_wakeup_time)
+
+    def reports_per_day(self) -> float:
+        if self.prd_mqtt_intvrl <= 0:
+            return 0.0
+        return self.wakes_per_day() / self.prd_mqtt_intvrl
+
+
+@dataclass
+class WakeScheduler:
+    settings: SchedulerSettings = field(default_factory=SchedulerSettings)
+    # Probability of movement per UTC hour of day
+    profile: List[float] = field(default_factory=lambda: [0.5] * 24)
+    samples: int = 0
+    last_fix: Optional[tuple] = None        # (lat, lon, datetime)
+    last_moved: Optional[datetime] = None
+    last_status: Optional[datetime] = None
+    bat_percent: Optional[int] = None
+    baseline: Optional[Plan] = None          # the user's own settings, never the adapted ones
+    current: Optional[Plan] = None           # what the device is running now
+    last_applied: Optional[datetime] = None
+
+    def on_location(self, lat: float, lon: float, when: datetime):
+        """Feed a GPS fix; updates the hourly movement probability"""
+        if self.last_fix is not None:
+            moved = _distance(self.last_fix[0], self.last_fix[1], lat, lon) >= self.settings.move_threshold
+            hour = when.astimezone(timezone.utc).hour
+            a = self.settings.learning_rate
+            self.profile[hour] = (1 - a) * self.profile[hour] + a * (1.0 if moved else 0.0)
+            self.samples += 1
+            if moved:
+                self.last_moved = when
+        self.last_fix = (lat, lon, when)
+
+    def on_status(self, bat_percent: int, when: datetime):
+        self.bat_percent = bat_percent
+        self.last_status = when
+
+    def on_config(self, prd_wakeup_time: int, prd_mqtt_intvrl: int):
+        """The tracker reported the config it is running"""
+        plan = Plan(prd_wakeup_time, prd_mqtt_intvrl)
+        if self.baseline is None:
+            self.baseline = plan
+        self.current = plan
+
+    def on_user_config(self, plan: Plan, now: datetime) -> bool:
+        """The user pushed their own settings; returns True if they changed the baseline.
+
+        Settings equal to the running plan are the adapted values echoed back
+        from Tracker/deviceconfig, not a choice by the user.
+        """
+        if plan == self.current and self.baseline is not None:
+            return False
+        self.baseline = plan
+        # The device now runs the user's settings; leave them alone for a while
+        self.mark_applied(plan, now)
+        return True
+
+    def movement_probability(self, now: datetime) -> float:
+        if self.last_moved is not None:
+            if (now - self.last_moved).total_seconds() < self.settings.recent_movement * 60:
+                return 1.0
+        return self.profile[now.astimezone(timezone.utc).hour]
+
+    def recommend(self, now: datetime) -> Plan:
+        s = self.settings
+        p = self.movement_probability(now)
+        wake = s.max_wake - p * (s.max_wake - s.min_wake)
+
+        if self.bat_percent is not None:
+            if self.bat_percent <= s.critical_battery:
+                wake *= 4
+            elif self.bat_percent <= s.low_battery:
+                wake *= 2
+
+        wake = int(min(max(wake, s.min_wake), s.max_wake * 4))
+        wake = max(s.min_wake, 5 * round(wake / 5))
+
+        if self.baseline is not None and self.baseline.prd_mqtt_intvrl == 0:
+            # The user turned MQTT location reports off; never turn them on
+            report = 0
+        elif p >= 0.5:
+            report = 1
+        else:
+            report = min(30, max(1, ceil(s.stationary_report / wake)))
+        return Plan(wake, report)
+
+    def should_apply(self, plan: Plan, now: datetime, min_gap: float = 1800) -> bool:
+        """Only reconfigure on a meaningful change, and not more than every min_gap seconds"""
+        if self.current is None or self.samples < self.settings.min_samples:
+            return False
+        if self.last_applied is not None and (now - self.last_applied).total_seconds() < min_gap:
+            return False
+        if plan.prd_mqtt_intvrl != self.current.prd_mqtt_intvrl:
+            return True
+        return abs(plan.prd_wakeup_time - self.current.prd_wakeup_time) >= 0.25 * max(1, self.current.prd_wakeup_time)
+
+    def mark_applied(self, plan: Plan, now: datetime):
+        self.current = plan
+        self.last_applied = now
+
+    def should_autowake(self, now: datetime) -> bool:
+        """Autowake only when the tracker has been quiet for longer than its schedule"""
+        if self.last_status is None or self.current is None:
+            return True
+        return (now - self.last_status).total_seconds() >= self.current.prd_wakeup_time * 60
+
+    def savings(self, now: datetime) -> dict:
+        """Estimated daily wake ups, reports and charge versus the baseline config"""
+        s = self.settings
+        plan = self.current or self.recommend(now)
+        base = self.baseline or plan
+
+        def cost(p: Plan) -> float:
+            return p.wakes_per_day() * s.wake_cost_mah + p.reports_per_day() * s.report_cost_mah
+
+        base_cost, plan_cost = cost(base), cost(plan)
+        return {
+            "baseline": vars(base),
+            "current": vars(plan),
+            "wakes_per_day_saved": round(base.wakes_per_day() - plan.wakes_per_day(), 1),
+            "reports_per_day_saved": round(base.reports_per_day() - plan.reports_per_day(), 1),
+            "mah_per_day_saved": round(base_cost - plan_cost, 1),
+            "battery_saving_percent": round(100 * (base_cost - plan_cost) / base_cost, 1) if base_cost else 0.0,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "profile": [round(p, 4) for p in self.profile],
+            "samples": self.samples,
+            "baseline": vars(self.baseline) if self.baseline else None,
+            # The next fix is only a sample if the previous one survives a restart
+            "last_fix": [self.last_fix[0], self.last_fix[1], self.last_fix[2].isoformat()] if self.last_fix else None,
+            "last_moved": self.last_moved.isoformat() if self.last_moved else None,
+        }
+
+    def load(self, data: dict):
+        """Restore the learned profile persisted by to_dict()"""
+        profile = data.get("profile")
+        if isinstance(profile, list) and len(profile) == 24:
+            self.profile = [float(p) for p in profile]
+        self.samples = int(data.get("samples", 0))
+        baseline = data.get("baseline")
+        if isinstance(baseline, dict):
+            self.baseline = Plan(int(baseline["prd_wakeup_time"]), int(baseline["prd_mqtt_intvrl"]))
+        last_fix = data.get("last_fix")
+        if isinstance(last_fix, list) and len(last_fix) == 3 and self.last_fix is None:
+            self.last_fix = (float(last_fix[0]), float(last_fix[1]), datetime.fromisoformat(last_fix[2]))
+        if data.get("last_moved") and self.last_moved is None:
+            self.last_moved = datetime.fromisoformat(data["last_moved"])
@@ -1,13 +1,17 @@
-from fastapi import FastAPI, APIRouter, Request, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, Request, HTTPException, BackgroundTasks, Depends
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 import os
 import json
 import asyncio
 import requests
 import logging
+import time
+import threading
+import uuid
+import contextvars
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Set
 from datetime import datetime, timezone
 import firebase_admin
 from firebase_admin import messaging, credentials, exceptions, db
@@ -21,16 +25,52 @@ from models import (
     DeviceStatus, GpsLocation, CallStatus, LedConfig, 
     DeviceConfig, Contacts, SmsMessage, Notification
 )
+from metrics import registry, loop_lag_monitor
+from outbox import Outbox
+from dedup import DedupCache, message_key
+from scheduler import WakeScheduler, SchedulerSettings, Plan
+from live import LiveBroadcaster
+from correlation import CommandCorrelator, PendingRequest, REPLY_TOPICS
+from docsync import DocumentSync
+from espnow_rules import EspNowRuleEngine
+from telemetry import TelemetryStore, RESOLUTIONS, FIELDS as TELEMETRY_FIELDS
+from battery import BatteryEstimator
+from leader import FileLease, FirebaseLease, LeaderElector
+from recorder import TrafficRecorder, recording_path
+from geocoder import ReverseGeocoder
+from sms import SmsStore, to_ranges
 
 # Firebase initialization
-firebase_json_str = os.getenv("FIREBASE_ADMIN_SDK_JSON")
-firebase_db_url = os.getenv("FIREBASE_DATABASE_URL")
-cred = credentials.Certificate(json.loads(firebase_json_str))
+# "eager" initializes at import (original behaviour), "lazy" defers it to the
+# first database call or the background warm-up started on startup.
+INIT_MODE = os.getenv("BACKEND_INIT_MODE", "eager").lower()
 
-if not firebase_admin._apps:
-    firebase_admin.initialize_app(cred, {
-        'databaseURL': firebase_db_url
-    })
+firebase_init_lock = threading.Lock()
+firebase_ready = threading.Event()
+
+def init_firebase():
+    """Create the Firebase app once; blocking, safe to call from any thread"""
+    if firebase_ready.is_set():
+        return
+    with firebase_init_lock:
+        if firebase_ready.is_set():
+            return
+        if not firebase_admin._apps:
+            firebase_json_str = os.getenv("FIREBASE_ADMIN_SDK_JSON")
+            firebase_db_url = os.getenv("FIREBASE_DATABASE_URL")
+            cred = credentials.Certificate(json.loads(firebase_json_str))
+            firebase_admin.initialize_app(cred, {
+                'databaseURL': firebase_db_url
+            })
+        firebase_ready.set()
+
+async def ensure_firebase():
+    """Initialize Firebase without blocking the event loop"""
+    if not firebase_ready.is_set():
+        await asyncio.to_thread(init_firebase)
+
+if INIT_MODE != "lazy":
+    init_firebase()
 
 # EMQX Configuration
 EMQX_API_URL = os.getenv("EMQX_API_URL")
@@ -50,53 +90,170 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Log every Nth MQTT payload at INFO (0 = only at DEBUG level)
+MQTT_PAYLOAD_LOG_SAMPLE = int(os.getenv("MQTT_PAYLOAD_LOG_SAMPLE", "0"))
+
+#--------------------------------------------------------------------------- 
+# Metrics, exposed at /api/metrics
+MQTT_MESSAGES = registry.counter(
+    "tracker_mqtt_messages_total", "MQTT webhook messages received", ["topic", "result"])
+MQTT_HANDLER_SECONDS = registry.histogram(
+    "tracker_mqtt_handler_seconds", "Time spent handling one MQTT webhook message", ["topic"])
+FIREBASE_OPS = registry.counter(
+    "tracker_firebase_operations_total", "Firebase database operations", ["op", "result"])
+FIREBASE_SECONDS = registry.histogram(
+    "tracker_firebase_operation_seconds", "Firebase database operation latency", ["op"])
+EMQX_PUBLISHES = registry.counter(
+    "tracker_emqx_publish_total", "EMQX HTTP publish calls", ["result"])
+EMQX_PUBLISH_SECONDS = registry.histogram(
+    "tracker_emqx_publish_seconds", "EMQX HTTP publish latency")
+FCM_SENDS = registry.counter(
+    "tracker_fcm_send_total", "FCM push sends", ["result"])
+FCM_SEND_SECONDS = registry.histogram(
+    "tracker_fcm_send_seconds", "FCM push send latency")
+COMMANDS = registry.counter(
+    "tracker_commands_total", "Frontend commands executed", ["command"])
+COMMAND_SECONDS = registry.histogram(
+    "tracker_command_seconds", "Frontend command execution time, including tracker wake up", ["command"])
+COMMAND_RTT_SECONDS = registry.histogram(
+    "tracker_command_rtt_seconds", "Time from publishing a request to the tracker's reply arriving", ["command"],
+    buckets=(0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0))
+COMMAND_TIMEOUTS = registry.counter(
+    "tracker_command_timeouts_total", "Requests the tracker did not answer in time", ["command"])
+MQTT_DUPLICATES = registry.counter(
+    "tracker_mqtt_duplicates_total", "Redelivered MQTT webhook messages dropped by deduplication", ["topic"])
+SYNC_SKIPPED = registry.counter(
+    "tracker_sync_skipped_total", "Document pushes skipped because the tracker already has them", ["kind"])
+SYNC_BYTES_SAVED = registry.counter(
+    "tracker_sync_bytes_saved_total", "Payload bytes saved by sending document diffs", ["kind"])
+ESPNOW_MESSAGES = registry.counter(
+    "tracker_espnow_messages_total", "ESP-NOW messages received", ["result"])
+ESPNOW_TRIGGERS = registry.counter(
+    "tracker_espnow_rule_triggers_total", "ESP-NOW rules that fired a notification", ["rule"])
+LIVE_SUBSCRIBERS = registry.gauge(
+    "tracker_live_subscribers", "Connected /api/live clients")
+LIVE_COALESCED = registry.gauge(
+    "tracker_live_coalesced_updates", "Live updates replaced before a slow client received them, since start")
+OUTBOX_DEPTH = registry.gauge(
+    "tracker_outbox_depth", "MQTT messages waiting in the local outbox")
+OUTBOX_DEAD = registry.gauge(
+    "tracker_outbox_dead_letters", "Outbox messages given up on and kept for inspection")
+OUTBOX_APPLIED = registry.counter(
+    "tracker_outbox_applied_total", "Outbox messages applied to Firebase", ["result"])
+OUTBOX_APPLY_SECONDS = registry.histogram(
+    "tracker_outbox_apply_seconds", "Time to apply one outbox message", ["topic"])
+LEADER = registry.gauge(
+    "tracker_leader", "1 while this instance owns the Firebase listeners")
+LEADER_TRANSITIONS = registry.counter(
+    "tracker_leader_transitions_total", "Times this instance gained or lost leadership", ["event"])
+
+# Topic suffixes handled by webhook_mqtt, used as bounded metric labels
+MQTT_TOPIC_LABELS = (
+    "status", "location", "call_status", "led_config", "config", "contacts",
+    "sms/stored", "sms/received", "espnow/received", "notification", "logs",
+    "events/connection", "events/disconnection",
+)
+
+def topic_label(topic: str) -> str:
+    """Map an MQTT topic to one of the handled suffixes, or 'other'"""
+    for label in MQTT_TOPIC_LABELS:
+        if topic.endswith("/" + label):
+            return label
+    return "other"
+
+#--------------------------------------------------------------------------- 
+# Set while the outbox drainer (or replay.py) applies a message, so writes use
+# the time the message was received and pushes get stable keys that are safe
+# to retry.
+message_context = contextvars.ContextVar("message_context", default=None)
+
+def note_firebase_failure():
+    """Flag the message being applied so the outbox retries it instead of dead-lettering"""
+    ctx = message_context.get()
+    if ctx is not None:
+        ctx["firebase_failed"] = True
+
+def message_time() -> datetime:
+    """Receive time of the message being handled, or now"""
+    ctx = message_context.get()
+    return ctx["received_at"] if ctx else datetime.now(timezone.utc)
+
 #--------------------------------------------------------------------------- 
 class FirebaseManager:
     @staticmethod
     def get_ref(path: str):
         """Get Firebase database reference"""
+        init_firebase()
         return db.reference(path)
     
     @staticmethod
     async def save_data(path: str, data: dict):
         """Save data to Firebase"""
+        await ensure_firebase()
         try:
-            ref = db.reference(path)
-            ref.set(data)
-            logger.info(f"Data saved to Firebase at {path}")
+            with FIREBASE_SECONDS.time(op="save"):
+                ref = db.reference(path)
+                ref.set(data)
+            FIREBASE_OPS.inc(op="save", result="ok")
+            logger.debug("Data saved to Firebase at %s", path)
         except Exception as e:
+            FIREBASE_OPS.inc(op="save", result="error")
+            note_firebase_failure()
             logger.error(f"Error saving to Firebase: {str(e)}")
             raise
     
     @staticmethod
     async def update_data(path: str, data: dict):
         """Update data in Firebase"""
+        await ensure_firebase()
         try:
-            ref = db.reference(path)
-            ref.update(data)
-            logger.info(f"Data updated in Firebase at {path}")
+            with FIREBASE_SECONDS.time(op="update"):
+                ref = db.reference(path)
+                ref.update(data)
+            FIREBASE_OPS.inc(op="update", result="ok")
+            logger.debug("Data updated in Firebase at %s", path)
         except Exception as e:
+            FIREBASE_OPS.inc(op="update", result="error")
+            note_firebase_failure()
             logger.error(f"Error updating Firebase: {str(e)}")
             raise
     
     @staticmethod
     async def get_data(path: str) -> Optional[dict]:
         """Get data from Firebase"""
+        await ensure_firebase()
         try:
-            ref = db.reference(path)
-            return ref.get()
+            with FIREBASE_SECONDS.time(op="get"):
+                ref = db.reference(path)
+                value = ref.get()
+            FIREBASE_OPS.inc(op="get", result="ok")
+            return value
         except Exception as e:
+            FIREBASE_OPS.inc(op="get", result="error")
+            note_firebase_failure()
             logger.error(f"Error getting data from Firebase: {str(e)}")
             return None
     
     @staticmethod
     async def push_data(path: str, data: dict) -> str:
         """Push data to Firebase list"""
+        await ensure_firebase()
         try:
-            ref = db.reference(path)
-            new_ref = ref.push(data)
+            ctx = message_context.get()
+            with FIREBASE_SECONDS.time(op="push"):
+                ref = db.reference(path)
+                if ctx is None:
+                    new_ref = ref.push(data)
+                else:
+                    # Idempotent push: a retried message overwrites its own entries
+                    ctx["pushes"] += 1
+                    new_ref = ref.child(f"{ctx['key']}-{ctx['pushes']}")
+                    new_ref.set(data)
+            FIREBASE_OPS.inc(op="push", result="ok")
             return new_ref.key
         except Exception as e:
+            FIREBASE_OPS.inc(op="push", result="error")
+            note_firebase_failure()
             logger.error(f"Error pushing to Firebase: {str(e)}")
             raise
 
@@ -119,21 +276,26 @@ class EMQXManager:
                 "payload": payload_str
             }
             
-            response = requests.post(
-                f"{EMQX_API_URL}/publish",
-                json=data,
-                auth=(EMQX_API_KEY, EMQX_SECRET_KEY),
-                headers={"Content-Type": "application/json"},
-            )
+            with EMQX_PUBLISH_SECONDS.time():
+                response = requests.post(
+                    f"{EMQX_API_URL}/publish",
+                    json=data,
+                    auth=(EMQX_API_KEY, EMQX_SECRET_KEY),
+                    headers={"Content-Type": "application/json"},
+                )
             
             if response.status_code == 200:
-                logger.info(f"Published to {topic}: {payload_str}")
+                EMQX_PUBLISHES.inc(result="ok")
+                logger.info(f"Published to {topic} ({len(payload_str)} bytes)")
+                logger.debug("Published payload: %s", payload_str)
                 return True
             else:
+                EMQX_PUBLISHES.inc(result="error")
                 logger.error(f"Failed to publish to EMQX: {response.status_code} - {response.text}")
                 return False
                 
         except Exception as e:
+            EMQX_PUBLISHES.inc(result="error")
             logger.error(f"Error publishing to EMQX: {str(e)}")
             return False
         
@@ -141,7 +303,9 @@ class EMQXManager:
     async def check_client() -> bool:
         """Check if a client is connected to EMQX broker via HTTP API"""
         try:
-            response = requests.get(
+            # Listing clients can be slow; keep it off the event loop
+            response = await asyncio.to_thread(
+                requests.get,
                 f"{EMQX_API_URL}/clients?_page=1&_limit=50",
                 auth=(EMQX_API_KEY, EMQX_SECRET_KEY),
                 headers={"Content-Type": "application/json"},
@@ -171,9 +335,92 @@ class EMQXManager:
 
 emqx_manager = EMQXManager()
 
+#--------------------------------------------------------------------------- 
+# Request/reply correlation for commands that make the tracker answer
+def on_command_reply(request: PendingRequest, rtt: float):
+    COMMAND_RTT_SECONDS.observe(rtt, command=request.command)
+    logger.info(f"Command {request.command} #{request.id} answered in {rtt:.2f}s")
+
+def on_command_timeout(request: PendingRequest):
+    COMMAND_TIMEOUTS.inc(command=request.command)
+    logger.warning(f"Command {request.command} #{request.id} got no reply")
+
+command_correlator = CommandCorrelator(
+    timeout=float(os.getenv("COMMAND_REPLY_TIMEOUT", "120")),
+    on_reply=on_command_reply,
+    on_timeout=on_command_timeout,
+)
+
+#--------------------------------------------------------------------------- 
+# Document sync: with DIFF_SYNC=1, set_contacts/set_ledconfig/set_config only
+# send the fields that differ from what the tracker last reported, plus a
+# version number, and nothing at all if the tracker is already up to date.
+DIFF_SYNC = os.getenv("DIFF_SYNC", "0") == "1"
+
+doc_sync = DocumentSync()
+
+async def acknowledge_document(kind: str, doc: dict):
+    """Remember the document the tracker reported as the base for later diffs"""
+    if doc_sync.acknowledge(kind, doc) and DIFF_SYNC:
+        await firebase_manager.save_data(
+            f"Backend/acked/{kind}",
+            {
+                "doc": doc_sync.acked[kind],
+                "version": doc_sync.versions.get(kind, 0)
+            }
+        )
+
+async def publish_document(kind: str, topic: str, desired: dict) -> bool:
+    """Publish a document, or only its changed fields when DIFF_SYNC is on"""
+    if not DIFF_SYNC:
+        return await emqx_manager.publish(topic, desired)
+
+    if not doc_sync.has_baseline(kind):
+        state = await firebase_manager.get_data(f"Backend/acked/{kind}")
+        if isinstance(state, dict):
+            doc_sync.load(kind, state)
+
+    changes = doc_sync.diff(kind, desired)
+    if changes == {}:
+        SYNC_SKIPPED.inc(kind=kind)
+        logger.info(f"Tracker {kind} already up to date, not publishing")
+        return True
+
+    # No baseline yet: send the whole document
+    payload = dict(desired if changes is None else changes)
+    payload["version"] = doc_sync.next_version(kind)
+    SYNC_BYTES_SAVED.inc(max(0, len(json.dumps(desired)) - len(json.dumps(payload))), kind=kind)
+
+    published = await emqx_manager.publish(topic, payload)
+    if published:
+        await firebase_manager.update_data(f"Backend/acked/{kind}", {"version": payload["version"]})
+    return published
+
 #--------------------------------------------------------------------------- 
 # Commands from frontend
-async def execute_command(command_data):
+KNOWN_COMMANDS = (
+    "get_status", "get_location", "get_contacts", "set_contacts", "make_call", "send_sms", "get_sms",
+    "sync_sms", "get_ledconfig", "set_ledconfig", "send_ir", "get_config", "set_config", "mode",
+    "mode_espnow", "send_espnow",
+)
+
+async def execute_command(command_data) -> Optional[PendingRequest]:
+    """Run a command; returns the pending request if the tracker will reply"""
+    command = command_data.get("command", "")
+    if not is_leader():
+        # Only the command queue's owner publishes to the tracker
+        logger.warning(f"Not the leader, not executing {command!r}")
+        return None
+    if command not in KNOWN_COMMANDS:
+        # Unknown names would wake the tracker for nothing and add metric labels
+        logger.warning(f"Ignoring unknown command: {command!r}")
+        await firebase_manager.update_data("Tracker/commands", {"pending": False})
+        return None
+    COMMANDS.inc(command=command)
+    with COMMAND_SECONDS.time(command=command):
+        return await _execute_command(command_data)
+
+async def _execute_command(command_data):
     command = command_data.get("command", "")
     data1 = command_data.get("data1", "")
     data2 = command_data.get("data2", "")
@@ -207,25 +454,31 @@ async def execute_command(command_data):
 
             return
 
+    # Track requests that expect a reply so the answer can be matched and timed
+    pending = None
+    published = False
+    if command != "get_status" or tracker_autowake:
+        pending = command_correlator.register(command, command_data.get("timeout"))
+
     if command == "get_status" and tracker_autowake:
-        await emqx_manager.publish("Tracker/to/request", "0")
+        published = await emqx_manager.publish("Tracker/to/request", "0")
 
     elif command == "get_location":
-        await emqx_manager.publish("Tracker/to/request", "1")
+        published = await emqx_manager.publish("Tracker/to/request", "1")
 
     elif command == "get_contacts":
-        await emqx_manager.publish("Tracker/to/request", "5")
+        published = await emqx_manager.publish("Tracker/to/request", "5")
 
     elif command == "set_contacts":
         #send the contacts json from realtime database as payload to Tracker/to/set/contacts
         contacts = await firebase_manager.get_data("Tracker/contacts")
         if "timestamp" in contacts:
             del contacts["timestamp"]
-        await emqx_manager.publish("Tracker/to/set/contacts", contacts)
+        published = await publish_document("contacts", "Tracker/to/set/contacts", contacts)
 
     elif command == "make_call":
         #send data1 as payload to Tracker/to/call
-        await emqx_manager.publish("Tracker/to/call", data1)
+        published = await emqx_manager.publish("Tracker/to/call", data1)
 
     elif command == "send_sms":
         #send data1 and data2 in sms model json to Tracker/to/sms/send
@@ -233,50 +486,148 @@ async def execute_command(command_data):
             "number": data1,
             "message": data2
         }
-        await emqx_manager.publish("Tracker/to/sms/send", sms)
+        published = await emqx_manager.publish("Tracker/to/sms/send", sms)
 
     elif command == "get_sms":
         #send data1 as payload to Tracker/to/sms/get
-        await emqx_manager.publish("Tracker/to/sms/get", data1)
+        published = await emqx_manager.publish("Tracker/to/sms/get", data1)
+        if published and str(data1).isdigit():
+            sms_store.expect([int(data1)])
+
+    elif command == "sync_sms":
+        #ask for every stored sms the backend has not indexed yet, in one request
+        published = await request_missing_sms()
 
     elif command == "get_ledconfig":
-        await emqx_manager.publish("Tracker/to/request", "3")
+        published = await emqx_manager.publish("Tracker/to/request", "3")
 
     elif command == "set_ledconfig":
         #send the ledconfig json from realtime database as payload to Tracker/to/set/led_config
         ledconfig = await firebase_manager.get_data("Tracker/ledconfig")
         if "timestamp" in ledconfig:
             del ledconfig["timestamp"]
-        await emqx_manager.publish("Tracker/to/set/led_config", ledconfig)
+        published = await publish_document("ledconfig", "Tracker/to/set/led_config", ledconfig)
 
     elif command == "send_ir":
         #send data1 as payload to Tracker/to/irsend
-        await emqx_manager.publish("Tracker/to/irsend", data1)
+        published = await emqx_manager.publish("Tracker/to/irsend", data1)
     
     elif command == "get_config":
-        await emqx_manager.publish("Tracker/to/request", "4")
+        published = await emqx_manager.publish("Tracker/to/request", "4")
 
     elif command == "set_config":
         #send the deviceconfig json from realtime database as payload to Tracker/to/set/config
         deviceconfig = await firebase_manager.get_data("Tracker/deviceconfig")
         if "timestamp" in deviceconfig:
             del deviceconfig["timestamp"]
-        await emqx_manager.publish("Tracker/to/set/config", deviceconfig)
+        published = await publish_document("deviceconfig", "Tracker/to/set/config", deviceconfig)
+        if published:
+            await record_user_schedule(deviceconfig)
 
     elif command == "mode":
         #send data1 as payload to Tracker/to/mode
-        await emqx_manager.publish("Tracker/to/mode", data1)
+        published = await emqx_manager.publish("Tracker/to/mode", data1)
 
     elif command == "mode_espnow":
         #send data1 as payload to Tracker/to/espnow/mode
-        await emqx_manager.publish("Tracker/to/espnow/mode", data1)
+        published = await emqx_manager.publish("Tracker/to/espnow/mode", data1)
     
     elif command == "send_espnow":
         #send data1 as payload to Tracker/to/espnow/send
-        await emqx_manager.publish("Tracker/to/espnow/send", data1)
+        published = await emqx_manager.publish("Tracker/to/espnow/send", data1)
+
+    if pending is not None and not published:
+        command_correlator.cancel(pending)
+        pending = None
 
     await firebase_manager.update_data("Tracker/commands", {"pending": False})
 
+    return pending
+
+#--------------------------------------------------------------------------- 
+# Adaptive wake scheduling: learn from status/location and retune the
+# periodic wake up interval through the normal set_config path
+ADAPTIVE_WAKEUP = os.getenv("ADAPTIVE_WAKEUP", "0") == "1"
+
+wake_scheduler = WakeScheduler(SchedulerSettings(
+    min_wake=int(os.getenv("ADAPTIVE_MIN_WAKE", "5")),
+    max_wake=int(os.getenv("ADAPTIVE_MAX_WAKE", "240")),
+))
+# Save the learned profile every N GPS fixes. Learning takes min_samples fixes
+# before the first apply, and a scale-to-zero host may restart between any
+# two of them, so the default saves after every fix
+ADAPTIVE_CHECKPOINT_FIXES = int(os.getenv("ADAPTIVE_CHECKPOINT_FIXES", "1"))
+scheduler_checkpoint = {"loaded": False, "fixes": 0}
+
+async def checkpoint_scheduler():
+    """Persist the profile learned so far, before any plan has been applied"""
+    # Until the stored profile is loaded, saving would overwrite it with a fresh one
+    if not is_leader() or not scheduler_checkpoint["loaded"]:
+        return
+    scheduler_checkpoint["fixes"] += 1
+    if scheduler_checkpoint["fixes"] < ADAPTIVE_CHECKPOINT_FIXES:
+        return
+    scheduler_checkpoint["fixes"] = 0
+    try:
+        await firebase_manager.update_data("Backend/scheduler", wake_scheduler.to_dict())
+    except Exception as e:
+        logger.error(f"Error saving scheduler profile: {str(e)}")
+
+async def record_user_schedule(config: dict):
+    """Keep the user's own wake/report settings under Preferences/schedule"""
+    plan = Plan(int(config.get("prd_wakeup_time", 120)), int(config.get("prd_mqtt_intvrl", 0)))
+    if wake_scheduler.on_user_config(plan, datetime.now(timezone.utc)):
+        await firebase_manager.save_data("Preferences/schedule", vars(plan))
+
+async def apply_adaptive_schedule():
+    """Push a new prd_wakeup_time/prd_mqtt_intvrl if the learned plan changed enough"""
+    if not is_leader():
+        return
+    try:
+        now = datetime.now(timezone.utc)
+        config = await firebase_manager.get_data("Tracker/deviceconfig")
+        if not isinstance(config, dict) or not config.get("prd_wakeup"):
+            return
+
+        if wake_scheduler.current is None:
+            wake_scheduler.on_config(config.get("prd_wakeup_time", 120), config.get("prd_mqtt_intvrl", 0))
+
+        plan = wake_scheduler.recommend(now)
+        if not wake_scheduler.should_apply(plan, now):
+            return
+
+        logger.info(f"Adaptive wake up: every {plan.prd_wakeup_time} min, report every {plan.prd_mqtt_intvrl} wake ups")
+
+        # Sent straight to the tracker: Tracker/deviceconfig is the user's to edit
+        adapted = {k: v for k, v in config.items() if k != "timestamp"}
+        adapted.update(vars(plan))
+        if not await publish_document("deviceconfig", "Tracker/to/set/config", adapted):
+            logger.error("Adaptive wake up config was not published")
+            return
+        wake_scheduler.mark_applied(plan, now)
+
+        await firebase_manager.save_data(
+            "Backend/scheduler",
+            {
+                **wake_scheduler.to_dict(),
+                "savings": wake_scheduler.savings(now),
+                "last_applied": now.isoformat()
+            }
+        )
+        scheduler_checkpoint["fixes"] = 0
+    except Exception as e:
+        logger.error(f"Error applying adaptive schedule: {str(e)}")
+
+async def load_scheduler_state():
+    state = await firebase_manager.get_data("Backend/scheduler")
+    if isinstance(state, dict):
+        wake_scheduler.load(state)
+    # The user's settings win over whatever baseline was persisted with the profile
+    schedule = await firebase_manager.get_data("Preferences/schedule")
+    if isinstance(schedule, dict):
+        wake_scheduler.baseline = Plan(int(schedule["prd_wakeup_time"]), int(schedule["prd_mqtt_intvrl"]))
+    scheduler_checkpoint["loaded"] = True
+
 def handle_command(event):
     data = event.data
     
@@ -302,18 +653,91 @@ def handle_frontend_status(event):
             loop
         )
 
+listener_registrations = []
+
 def start_listener():
+    init_firebase()
+
     ref_commands = db.reference("Tracker/commands")
-    ref_commands.listen(handle_command)
+    listener_registrations.append(ref_commands.listen(handle_command))
     
     ref_frontend = db.reference("Frontend/online")
-    ref_frontend.listen(handle_frontend_status)
+    listener_registrations.append(ref_frontend.listen(handle_frontend_status))
+
+    readiness["listeners"] = True
+
+def stop_listener():
+    while listener_registrations:
+        try:
+            listener_registrations.pop().close()
+        except Exception as e:
+            logger.error(f"Error closing listener: {str(e)}")
+
+    readiness["listeners"] = False
+
+#--------------------------------------------------------------------------- 
+# Leader election: with several workers or replicas only one may attach the
+# command listeners, otherwise every command is executed once per instance.
+# "off" (default) keeps the single-instance behaviour, "file" uses a lock
+# file shared by workers on one host, "firebase" a TTL lease in the database.
+#
+# With election on, every instance only validates webhooks and appends them
+# to the shared outbox (INGEST_MODE is forced to "outbox"), so webhook load
+# spreads over all workers. The leader alone drains the outbox, so telemetry
+# and battery aggregates, alerts, ESP-NOW cooldowns, the scheduler, the live
+# stream and command execution all run in one process and see every message.
+# The outbox file is the hand-off, so all instances must share OUTBOX_PATH.
+# Endpoints that read the leader's memory answer 503 with Retry-After on
+# followers.
+LEADER_ELECTION = os.getenv("LEADER_ELECTION", "off").lower()
+LEADER_LOCK_PATH = os.getenv("LEADER_LOCK_PATH", "tracker-leader.lock")
+LEADER_LEASE_TTL = float(os.getenv("LEADER_LEASE_TTL", "30"))
+# Renew well inside the TTL so a slow round trip does not drop the lease
+LEADER_RENEW_INTERVAL = LEADER_LEASE_TTL / 3
+
+def on_elected():
+    LEADER.set(1)
+    LEADER_TRANSITIONS.inc(event="elected")
+    start_listener()
+    if outbox is not None:
+        loop.call_soon_threadsafe(start_drainer)
+
+def on_demoted():
+    LEADER.set(0)
+    LEADER_TRANSITIONS.inc(event="demoted")
+    stop_listener()
+    if outbox is not None:
+        loop.call_soon_threadsafe(stop_drainer)
+
+def lease_reference(path: str):
+    init_firebase()
+    return db.reference(path)
+
+def create_leader_elector():
+    if LEADER_ELECTION == "file":
+        lease = FileLease(LEADER_LOCK_PATH)
+    elif LEADER_ELECTION == "firebase":
+        lease = FirebaseLease(lease_reference, "Backend/leader", ttl=LEADER_LEASE_TTL)
+    else:
+        return None
+    return LeaderElector(lease, LEADER_RENEW_INTERVAL, on_elected, on_demoted)
+
+leader_elector = create_leader_elector()
+
+def is_leader() -> bool:
+    return leader_elector is None or leader_elector.is_leader
+
+def require_leader():
+    """Endpoint dependency for state that only the leader has complete"""
+    if not is_leader():
+        raise HTTPException(status_code=503, detail="Served by the leader instance only",
+                            headers={"Retry-After": "1"})
 
 #--------------------------------------------------------------------------- 
 async def send_notification(notification: Notification, user_id: str = "default_user"):
     """Save and send a push notification to Firebase + FCM"""
     
-    timestamp = datetime.now(timezone.utc).isoformat()
+    timestamp = message_time().isoformat()
 
     try:
         await firebase_manager.push_data(
@@ -355,114 +779,431 @@ async def send_notification(notification: Notification, user_id: str = "default_
         )
 
         try:
-            response = messaging.send(msg)
+            with FCM_SEND_SECONDS.time():
+                response = messaging.send(msg)
+            FCM_SENDS.inc(result="ok")
             logger.info(f"Push sent to {user_id}, FCM response: {response}")
         except exceptions.FirebaseError as e:
+            FCM_SENDS.inc(result="error")
             logger.error(f"FCM push failed: {e.code} - {e.message}")
         except Exception as e:
+            FCM_SENDS.inc(result="error")
             logger.error(f"Unexpected FCM push error: {e}")
 
     except Exception as e:
         logger.error(f"Error fetching tokens or sending push: {e}")
 
 
+#--------------------------------------------------------------------------- 
+# Live state for /api/live subscribers, published straight from the handlers
+live = LiveBroadcaster()
+
 #--------------------------------------------------------------------------- 
 # Webhook endpoints for EMQX HTTP connector
+mqtt_message_count = 0
+
+# "direct" applies messages inside the webhook, "outbox" appends them to a
+# local SQLite outbox, acks immediately and applies them from drain_outbox
+INGEST_MODE = os.getenv("INGEST_MODE", "direct").lower()
+if LEADER_ELECTION != "off":
+    # Followers hand every message to the leader through the outbox
+    INGEST_MODE = "outbox"
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", "outbox.db")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "20"))
+OUTBOX_RETRY_MAX = float(os.getenv("OUTBOX_RETRY_MAX", "60"))
+
+outbox = Outbox(OUTBOX_PATH, os.getenv("OUTBOX_SYNC", "NORMAL")) if INGEST_MODE == "outbox" else None
+outbox_wakeup = asyncio.Event()
+
+# Record every webhook body to gzip JSONL for replay.py; each process writes
+# its own file next to MQTT_RECORD_PATH
+MQTT_RECORD_PATH = os.getenv("MQTT_RECORD_PATH")
+traffic_recorder = TrafficRecorder(recording_path(MQTT_RECORD_PATH)) if MQTT_RECORD_PATH else None
+
+# EMQX retries on 500s and timeouts; remember recent messages so a retry
+# does not push a second history entry or send a second notification
+dedup_cache = DedupCache(
+    max_entries=int(os.getenv("DEDUP_MAX_ENTRIES", "10000")),
+    ttl=float(os.getenv("DEDUP_TTL", "120")),
+)
+# Messages still being handled; a copy arriving meanwhile waits on the future
+dedup_inflight: Dict[str, asyncio.Future] = {}
+# Messages the drainer applied. A retry that reached another worker after the
+# original's row was applied and deleted is queued again and dropped here
+applied_cache = DedupCache(
+    max_entries=int(os.getenv("DEDUP_MAX_ENTRIES", "10000")),
+    ttl=float(os.getenv("DEDUP_TTL", "120")),
+)
+# Outbox keys whose live update this process already sent at ingest
+live_sent: Set[str] = set()
+
+def log_mqtt_message(topic: str, payload_raw: Any):
+    """Log MQTT payloads lazily; only every Nth one is formatted at INFO"""
+    global mqtt_message_count
+    mqtt_message_count += 1
+    if MQTT_PAYLOAD_LOG_SAMPLE and mqtt_message_count % MQTT_PAYLOAD_LOG_SAMPLE == 0:
+        logger.info("MQTT Message → Topic: %s, Payload: %s", topic, payload_raw)
+    else:
+        logger.debug("MQTT Message → Topic: %s, Payload: %s", topic, payload_raw)
+
 @api_router.post("/webhook/mqtt")
 async def webhook_mqtt(request: Request, background_tasks: BackgroundTasks):
     """Catch all MQTT messages from EMQX connector"""
+    label = "other"
+    result = "ok"
+    start = time.perf_counter()
+    key = None
+    inflight = None
     try:
         body = await request.json()
 
-        topic = body.get("topic")
-        payload_raw = body.get("payload")
-        
-        try:
-            payload = json.loads(payload_raw)
-        except Exception:
-            payload = payload_raw
-
-        logger.info(f"MQTT Message → Topic: {topic}, Payload: {payload}")
-
-
-        if "Tracker/from/" in topic:
-            await firebase_manager.update_data(
-                f"Tracker/MQTT",
-                {
-                    "last_message": datetime.now(timezone.utc).isoformat()
-                }
-            )
-
-        # Route based on topic
-        if topic.endswith("/status"):
-            status_obj = DeviceStatus(**payload)
-            return await webhook_status(status_obj, background_tasks)
+        if traffic_recorder is not None:
+            # Before dedup, so a replay sees redeliveries exactly as they arrived
+            traffic_recorder.record(body)
+
+        topic = body.get("topic") or ""
+        label = topic_label(topic)
+
+        log_mqtt_message(topic, body.get("payload"))
+
+        key = message_key(body)
+        # A retry racing the original waits for its outcome: it is acked as a
+        # duplicate only if the original went through, otherwise it is handled
+        while key in dedup_inflight:
+            await asyncio.shield(dedup_inflight[key])
+        # Under replay.py the TTL must run on the recorded clock, not the replay's
+        dedup_now = message_time().timestamp() if message_context.get() is not None else None
+        if dedup_cache.seen(key, dedup_now):
+            result = "duplicate"
+            MQTT_DUPLICATES.inc(topic=label)
+            return {"success": True, "duplicate": True}
+        inflight = dedup_inflight[key] = asyncio.get_running_loop().create_future()
+
+        if outbox is not None:
+            # EMQX's message id makes redelivered messages collapse into one row
+            row_key = str(body.get("id") or uuid.uuid4().hex)
+            if outbox.append(row_key, body, message_time().timestamp()) and is_leader():
+                # Live clients should not wait for the drainer to catch up;
+                # followers leave it to the leader, which owns /api/live
+                if publish_live_at_ingest(body):
+                    live_sent.add(row_key)
+            if is_leader():
+                # A follower's count only grows; the drainer refreshes the leader's
+                OUTBOX_DEPTH.set(outbox.depth())
+            outbox_wakeup.set()
+            response = {"success": True, "queued": True}
+        else:
+            if "Tracker/from/" in topic:
+                await firebase_manager.update_data(
+                    f"Tracker/MQTT",
+                    {
+                        "last_message": message_time().isoformat()
+                    }
+                )
 
-        elif topic.endswith("/location"):
-            loc_obj = GpsLocation(**payload)
-            return await webhook_location(loc_obj, background_tasks)
+            topic, payload = parse_mqtt_body(body)
+            response = await route_mqtt_message(topic, payload, background_tasks)
 
-        elif topic.endswith("/call_status"):
-            cals_obj = CallStatus(**payload)
-            return await webhook_callstatus(cals_obj, background_tasks)
+        # Marked only once handled, so a failed message can still be retried
+        dedup_cache.add(key, dedup_now)
+        return response
+    except Exception as e:
+        result = "error"
+        logger.error(f"Error processing MQTT webhook: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if inflight is not None:
+            dedup_inflight.pop(key, None)
+            inflight.set_result(None)
+        MQTT_MESSAGES.inc(topic=label, result=result)
+        MQTT_HANDLER_SECONDS.observe(time.perf_counter() - start, topic=label)
+
+# Live updates built from the payload alone, sent when a message is queued;
+# keyed by topic_label so they match the topics dispatch_mqtt_message routes
+LIVE_AT_INGEST = {"status": ("status", DeviceStatus), "call_status": ("callstatus", CallStatus)}
+
+def publish_live_at_ingest(body: dict) -> bool:
+    topic, payload = parse_mqtt_body(body)
+    live_kind = LIVE_AT_INGEST.get(topic_label(topic))
+    if live_kind is None:
+        return False
+    kind, model = live_kind
+    try:
+        data = model(**payload).dict()
+    except Exception:
+        return False  # the drainer dead-letters it
+    data["timestamp"] = message_time().isoformat()
+    live.publish(kind, data)
+    return True
+
+def live_published_at_ingest() -> bool:
+    """True while the drainer applies a queued message whose live update already went out"""
+    ctx = message_context.get()
+    return bool(ctx and ctx.get("live_sent"))
+
+def parse_mqtt_body(body: dict):
+    """Split an EMQX connector body into topic and decoded payload"""
+    topic = body.get("topic") or ""
+    payload_raw = body.get("payload")
+    try:
+        payload = json.loads(payload_raw)
+    except Exception:
+        payload = payload_raw
+    return topic, payload
+
+async def route_mqtt_message(topic: str, payload: Any, background_tasks: BackgroundTasks):
+    """Dispatch a message, then hand it to any request waiting for this reply"""
+    response = await dispatch_mqtt_message(topic, payload, background_tasks)
+    command_correlator.resolve(topic_label(topic), payload)
+    return response
+
+async def dispatch_mqtt_message(topic: str, payload: Any, background_tasks: BackgroundTasks):
+    """Validate the payload and dispatch it to the handler for its topic"""
+    # Route based on topic
+    if topic.endswith("/status"):
+        status_obj = DeviceStatus(**payload)
+        return await webhook_status(status_obj, background_tasks)
+
+    elif topic.endswith("/location"):
+        loc_obj = GpsLocation(**payload)
+        return await webhook_location(loc_obj, background_tasks)
+
+    elif topic.endswith("/call_status"):
+        cals_obj = CallStatus(**payload)
+        return await webhook_callstatus(cals_obj, background_tasks)
     
-        elif topic.endswith("/led_config"):
-            ledconf_obj = LedConfig(**payload)
-            return await webhook_ledconfig(ledconf_obj, background_tasks)
+    elif topic.endswith("/led_config"):
+        ledconf_obj = LedConfig(**payload)
+        return await webhook_ledconfig(ledconf_obj, background_tasks)
     
-        elif topic.endswith("/config"):
-            conf_obj = DeviceConfig(**payload)
-            return await webhook_deviceconfig(conf_obj, background_tasks)
+    elif topic.endswith("/config"):
+        conf_obj = DeviceConfig(**payload)
+        return await webhook_deviceconfig(conf_obj, background_tasks)
     
-        elif topic.endswith("/contacts"):
-            ctns_obj = Contacts(**payload)
-            return await webhook_contacts(ctns_obj, background_tasks)
-        
-        elif topic.endswith("/sms/stored"):
-            ssms_obj = SmsMessage(**payload)
-            return await webhook_storedsms(ssms_obj, background_tasks)
-        
-        elif topic.endswith("/sms/received"):
-            payload_str = str(payload)
-            return await webhook_newsms(payload_str, background_tasks)
+    elif topic.endswith("/contacts"):
+        ctns_obj = Contacts(**payload)
+        return await webhook_contacts(ctns_obj, background_tasks)
+    
+    elif topic.endswith("/sms/stored"):
+        ssms_obj = SmsMessage(**payload)
+        return await webhook_storedsms(ssms_obj, background_tasks)
+    
+    elif topic.endswith("/sms/received"):
+        payload_str = str(payload)
+        return await webhook_newsms(payload_str, background_tasks)
 
-        elif topic.endswith("/espnow/received"):
-            if isinstance(payload, str):
-                return await webhook_espnow(payload, background_tasks)
-            
-        elif topic.endswith("/notification"):
-            noti_obj = Notification(**payload)
-            return await webhook_notification(noti_obj, background_tasks)
+    elif topic.endswith("/espnow/received"):
+        if isinstance(payload, str):
+            return await webhook_espnow(payload, background_tasks)
         
-        elif topic.endswith("/logs"):
-            if isinstance(payload, dict):
-                return await webhook_logs(payload, background_tasks)
+    elif topic.endswith("/notification"):
+        noti_obj = Notification(**payload)
+        return await webhook_notification(noti_obj, background_tasks)
+    
+    elif topic.endswith("/logs"):
+        if isinstance(payload, dict):
+            return await webhook_logs(payload, background_tasks)
 
-        elif topic.endswith("/events/connection"):
-            if isinstance(payload, dict):
-                return await webhook_connection(payload, background_tasks)
-        
-        elif topic.endswith("/events/disconnection"):
-            if isinstance(payload, dict):
-                return await webhook_disconnection(payload, background_tasks)
+    elif topic.endswith("/events/connection"):
+        if isinstance(payload, dict):
+            return await webhook_connection(payload, background_tasks)
+    
+    elif topic.endswith("/events/disconnection"):
+        if isinstance(payload, dict):
+            return await webhook_disconnection(payload, background_tasks)
 
-        else:
-            logger.warning(f"Unhandled topic: {topic}")
+    else:
+        logger.warning(f"Unhandled topic: {topic}")
 
-        return {"success": True}
+    return {"success": True}
+
+#--------------------------------------------------------------------------- 
+# Outbox drainer
+async def apply_outbox_record(record) -> str:
+    """Apply one outbox message; returns 'ok', 'retry' or 'dead'"""
+    topic, payload = parse_mqtt_body(record.body)
+    label = topic_label(topic)
+    key = message_key(record.body)
+    if applied_cache.seen(key, record.received_at):
+        # Each worker dedups only what it received; this one was applied already
+        MQTT_DUPLICATES.inc(topic=label)
+        live_sent.discard(record.key)
+        return "ok"
+    tasks = BackgroundTasks()
+    token = message_context.set({
+        "key": f"{int(record.received_at * 1000):013d}-{record.id}",
+        "received_at": datetime.fromtimestamp(record.received_at, timezone.utc),
+        "pushes": 0,
+        "live_sent": record.key in live_sent,
+    })
+    try:
+        with OUTBOX_APPLY_SECONDS.time(topic=label):
+            await route_mqtt_message(topic, payload, tasks)
+        applied_cache.add(key, record.received_at)
+        live_sent.discard(record.key)
+
+        # Notifications go out only once the writes have landed
+        run_in_background(tasks())
+        return "ok"
     except Exception as e:
-        logger.error(f"Error processing MQTT webhook: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        error = str(e.detail) if isinstance(e, HTTPException) else str(e)
+        ctx = message_context.get()
+        if ctx.get("firebase_failed") or not firebase_ready.is_set():
+            # Firebase was unreachable; the same message will apply once it is back
+            dead = record.attempts + 1 >= OUTBOX_MAX_ATTEMPTS
+            outbox.fail(record.id, error, dead=dead)
+            logger.error(f"Outbox message {record.id} failed (attempt {record.attempts + 1}): {error}")
+            return "dead" if dead else "retry"
+        # Invalid payload or a handler bug; retrying would only block the queue
+        outbox.fail(record.id, error, dead=True)
+        logger.error(f"Outbox message {record.id} on {topic} rejected: {error}")
+        return "dead"
+    finally:
+        message_context.reset(token)
+
+async def drain_outbox():
+    """Apply queued messages in order, backing off while Firebase is failing"""
+    backoff = 1.0
+    while True:
+        outbox_wakeup.clear()
+        records = outbox.fetch(OUTBOX_BATCH_SIZE)
+        if not records:
+            try:
+                await asyncio.wait_for(outbox_wakeup.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        applied = []
+        last_message = None
+        stalled = False
+        for record in records:
+            outcome = await apply_outbox_record(record)
+            OUTBOX_APPLIED.inc(result=outcome)
+            if outcome == "retry":
+                # Keep ordering: later messages wait for this one
+                stalled = True
+                break
+            if outcome == "ok":
+                applied.append(record.id)
+                if "Tracker/from/" in record.body.get("topic", ""):
+                    last_message = record.received_at
+
+        outbox.ack(applied)
+        # Recount only here, off the webhook path; COUNT(*) grows with the backlog
+        outbox.refresh()
+        OUTBOX_DEPTH.set(outbox.depth())
+        OUTBOX_DEAD.set(outbox.dead_letters())
+
+        # One last_message write per batch instead of one per message
+        if last_message is not None:
+            try:
+                await firebase_manager.update_data(
+                    "Tracker/MQTT",
+                    {
+                        "last_message": datetime.fromtimestamp(last_message, timezone.utc).isoformat()
+                    }
+                )
+            except Exception:
+                pass
+
+        if stalled:
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, OUTBOX_RETRY_MAX)
+        else:
+            backoff = 1.0
     
+# Downsampled battery/signal/light aggregates for charts. Closed buckets are
+# persisted under Tracker/telemetry/<resolution>/<bucket start>.
+telemetry = TelemetryStore()
+
+async def persist_telemetry(closed):
+    """Write closed buckets, drop evicted ones and checkpoint the open ones"""
+    if not is_leader():
+        # A follower only holds the samples it happened to ingest
+        return
+    changes = {}
+    for res, bucket, evicted in closed:
+        changes.setdefault(res, {})[str(bucket.start)] = bucket.to_dict()
+        if evicted is not None:
+            changes[res][str(evicted.start)] = None
+
+    # Open hour/day buckets would otherwise be lost on restart
+    for res, bucket in telemetry.open_buckets():
+        changes.setdefault(res, {})[str(bucket.start)] = bucket.to_dict()
+
+    for res, update in changes.items():
+        try:
+            await firebase_manager.update_data(f"Tracker/telemetry/{res}", update)
+        except Exception as e:
+            logger.error(f"Error saving {res} telemetry: {str(e)}")
+
+async def load_telemetry():
+    now = datetime.now(timezone.utc).timestamp()
+    for res in RESOLUTIONS:
+        buckets = await firebase_manager.get_data(f"Tracker/telemetry/{res}")
+        if isinstance(buckets, dict):
+            telemetry.load(res, buckets.values(), now)
+
+# Discharge rate per power state and a one-shot alert per time-left threshold
+battery_estimator = BatteryEstimator(
+    thresholds=[float(h) for h in os.getenv("BATTERY_ALERT_HOURS", "24,6").split(",") if h.strip()]
+)
+
+async def persist_battery():
+    if not is_leader():
+        return
+    try:
+        await firebase_manager.save_data("Backend/battery", battery_estimator.to_dict())
+    except Exception as e:
+        logger.error(f"Error saving battery estimator: {str(e)}")
+
+async def load_battery_state():
+    state = await firebase_manager.get_data("Backend/battery")
+    if isinstance(state, dict):
+        battery_estimator.load(state)
+
 async def webhook_status(status: DeviceStatus, background_tasks: BackgroundTasks):
     """Handle device status updates from EMQX webhook"""
     try:
         status_dict = status.dict()
-        status_dict["timestamp"] = datetime.now(timezone.utc).isoformat()
+        status_dict["timestamp"] = message_time().isoformat()
+
+        if not live_published_at_ingest():
+            live.publish("status", status_dict)
 
         # Save to Firebase
         await firebase_manager.update_data("Tracker/status/latest", status_dict)
         await firebase_manager.push_data("Tracker/status/history", status_dict)
+        await record_sms_count(status.stored_sms)
+
+        # Fold the sample into the in-memory estimators only once it is stored,
+        # so a retried message is not counted twice
+        closed = telemetry.add(status_dict, message_time().timestamp())
+        if closed:
+            background_tasks.add_task(persist_telemetry, closed)
+
+        revision = battery_estimator.revision
+        crossed = battery_estimator.update(
+            status.bat_percent, status.bat_voltage, status.sleep_mode,
+            status.gps_fix, status.wifi_enabled, message_time().timestamp()
+        )
+        if battery_estimator.revision != revision:
+            # Rates and sent alerts must survive a restart, or alerts re-arm
+            background_tasks.add_task(persist_battery)
+        if crossed is not None:
+            summary = battery_estimator.summary()["current"]
+            notification = Notification(
+                title="Battery Low",
+                message=f"Battery at {status.bat_percent}%, about {summary['hours_left']} hours left ({summary['state']})",
+                type="high_priority"
+            )
+            background_tasks.add_task(send_notification, notification)
+        wake_scheduler.on_status(status.bat_percent, message_time())
+        if ADAPTIVE_WAKEUP and status.currently_active:
+            # The tracker is listening right now, so a config push lands immediately
+            background_tasks.add_task(apply_adaptive_schedule)
 
         # send_reason: 
         # 0 - boot (non-sleepmode)
@@ -509,6 +1250,26 @@ def haversine(lat1, lon1, lat2, lon2):
     c = 2 * atan2(sqrt(a), sqrt(1 - a))
     return R * c
 
+# Offline reverse geocoding of location updates; off unless a gazetteer is
+# configured, e.g. GeoNames cities15000.zip
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH")
+GEOCODE_MAX_KM = float(os.getenv("GEOCODE_MAX_KM", "25"))
+geocoder: Optional[ReverseGeocoder] = None
+
+async def load_gazetteer():
+    global geocoder
+    try:
+        geocoder = await asyncio.to_thread(ReverseGeocoder.from_file, GAZETTEER_PATH, max_km=GEOCODE_MAX_KM)
+        logger.info(f"Loaded {geocoder.gazetteer.size} places from {GAZETTEER_PATH}")
+    except Exception as e:
+        logger.error(f"Error loading gazetteer {GAZETTEER_PATH}: {str(e)}")
+
+def place_near(lat: float, lon: float) -> Optional[str]:
+    if geocoder is None or not (lat or lon):
+        return None
+    found = geocoder.lookup(lat, lon)
+    return found["label"] if found else None
+
 async def webhook_location(location: GpsLocation, background_tasks: BackgroundTasks):
     """Handle GPS location updates from EMQX webhook"""
     try:
@@ -526,7 +1287,7 @@ async def webhook_location(location: GpsLocation, background_tasks: BackgroundTa
                 "speed": location.speed,
                 "course": location.course,
                 "sats": location.sats,
-                "gps_timestamp": datetime.now(timezone.utc).isoformat()
+                "gps_timestamp": message_time().isoformat()
             })
         else:
             logger.info("GPS fix not found, using last data.")
@@ -548,7 +1309,7 @@ async def webhook_location(location: GpsLocation, background_tasks: BackgroundTa
                 "send_reason_lbs": location.send_reason,
                 "lbs_lat": location.lbs_lat,
                 "lbs_lon": location.lbs_lon,
-                "lbs_timestamp": datetime.now(timezone.utc).isoformat()
+                "lbs_timestamp": message_time().isoformat()
             })
         else:
             logger.info("LBS fix not found, using last data.")
@@ -559,17 +1320,25 @@ async def webhook_location(location: GpsLocation, background_tasks: BackgroundTa
                 "lbs_timestamp": stored_location.get("lbs_timestamp")
             })
 
+        if geocoder is not None:
+            if location.gps_fix:
+                new_location["place"] = place_near(location.gps_lat, location.gps_lon)
+            elif location.lbs_fix:
+                new_location["place"] = place_near(location.lbs_lat, location.lbs_lon)
+            else:
+                new_location["place"] = stored_location.get("place")
+
         # Convert datetime objects before saving
         new_location = {
             k: (v.isoformat() if isinstance(v, datetime) else v)
             for k, v in new_location.items()
         }
 
+        live.publish("location", dict(new_location))
         await firebase_manager.update_data("Tracker/location/latest", new_location)
         
         # If there is gps fix, then store history and send notification
         if location.gps_fix:
-
             # Calculate distance difference
             last_lat = float(stored_location.get("gps_lat", 0.0))
             last_lon = float(stored_location.get("gps_lon", 0.0))
@@ -579,6 +1348,9 @@ async def webhook_location(location: GpsLocation, background_tasks: BackgroundTa
             new_location["distance_from_last_update"] = int(distance)
 
             await firebase_manager.push_data("Tracker/location/history", new_location)
+            wake_scheduler.on_location(location.gps_lat, location.gps_lon, message_time())
+            if ADAPTIVE_WAKEUP:
+                background_tasks.add_task(checkpoint_scheduler)
 
             if location.prd_wakeup_num != 0 and location.send_reason == 5:
                 if distance >= 1000:
@@ -598,6 +1370,9 @@ async def webhook_location(location: GpsLocation, background_tasks: BackgroundTa
                 else:
                     message = f"Device moved by {int(distance)} meters."
 
+            if new_location.get("place"):
+                message = f"{message[:-1]} near {new_location['place']}."
+
             notification = Notification(
                 title="Location Update",
                 message=message,
@@ -614,7 +1389,9 @@ async def webhook_callstatus(callstatus: CallStatus, background_tasks: Backgroun
     """Handle CallStatus messages from EMQX webhook"""
     try:
         callstatus_dict = callstatus.dict()
-        callstatus_dict["timestamp"] = datetime.now(timezone.utc).isoformat()
+        callstatus_dict["timestamp"] = message_time().isoformat()
+        if not live_published_at_ingest():
+            live.publish("callstatus", callstatus_dict)
         
         # Save to Firebase
         await firebase_manager.update_data("Tracker/callstatus", callstatus_dict)
@@ -637,10 +1414,11 @@ async def webhook_ledconfig(ledconfig: LedConfig, background_tasks: BackgroundTa
     """Handle LedConfig messages from EMQX webhook"""
     try:
         ledconfig_dict = ledconfig.dict()
-        ledconfig_dict["timestamp"] = datetime.now(timezone.utc).isoformat()
+        ledconfig_dict["timestamp"] = message_time().isoformat()
         
         # Save to Firebase
         await firebase_manager.update_data("Tracker/ledconfig", ledconfig_dict)
+        await acknowledge_document("ledconfig", ledconfig_dict)
         
         return {"success": True}
     except Exception as e:
@@ -651,10 +1429,13 @@ async def webhook_deviceconfig(deviceconfig: DeviceConfig, background_tasks: Bac
     """Handle deviceconfig messages from EMQX webhook"""
     try:
         deviceconfig_dict = deviceconfig.dict()
-        deviceconfig_dict["timestamp"] = datetime.now(timezone.utc).isoformat()
+        deviceconfig_dict["timestamp"] = message_time().isoformat()
+
+        wake_scheduler.on_config(deviceconfig.prd_wakeup_time, deviceconfig.prd_mqtt_intvrl)
         
         # Save to Firebase
         await firebase_manager.update_data("Tracker/deviceconfig", deviceconfig_dict)
+        await acknowledge_document("deviceconfig", deviceconfig_dict)
         
         return {"success": True}
     except Exception as e:
@@ -665,24 +1446,83 @@ async def webhook_contacts(contacts: Contacts, background_tasks: BackgroundTasks
     """Handle contacts messages from EMQX webhook"""
     try:
         contacts_dict = contacts.dict()
-        contacts_dict["timestamp"] = datetime.now(timezone.utc).isoformat()
+        contacts_dict["timestamp"] = message_time().isoformat()
         
         # Save to Firebase
         await firebase_manager.update_data("Tracker/contacts", contacts_dict)
+        await acknowledge_document("contacts", contacts_dict)
         
         return {"success": True}
     except Exception as e:
         logger.error(f"Error handling contacts webhook: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Indexed copy of the SIM inbox, persisted under Tracker/sms. Range requests
+# ("1-4,7") need firmware support, so like DIFF_SYNC they are opt-in; without
+# them missing messages are requested one index per publish.
+SMS_FETCH_BATCH = int(os.getenv("SMS_FETCH_BATCH", "20"))
+SMS_RANGE_FETCH = os.getenv("SMS_RANGE_FETCH", "0") == "1"
+SMS_AUTO_FETCH = os.getenv("SMS_AUTO_FETCH", "0") == "1"
+sms_store = SmsStore()
+
+async def record_sms_count(count: int):
+    if count == sms_store.count:
+        return
+    update = {"count": count}
+    if sms_store.count is not None and count < sms_store.count:
+        update["index"] = None
+    # Stored first so a failed write is retried with the count still unseen
+    await firebase_manager.update_data("Tracker/sms", update)
+    sms_store.set_count(count)
+
+async def request_missing_sms() -> bool:
+    """Ask the tracker for the stored messages missing locally"""
+    if sms_store.count is None:
+        count = await firebase_manager.get_data("Tracker/status/latest/stored_sms")
+        if isinstance(count, int):
+            await record_sms_count(count)
+
+    indices = sms_store.missing(SMS_FETCH_BATCH)
+    if not indices:
+        return False
+
+    if SMS_RANGE_FETCH:
+        published = await emqx_manager.publish("Tracker/to/sms/get", to_ranges(indices))
+        if published:
+            sms_store.expect(indices)
+        return published
+
+    published = False
+    for index in indices:
+        if not await emqx_manager.publish("Tracker/to/sms/get", str(index)):
+            break
+        sms_store.expect([index])
+        published = True
+    return published
+
+async def load_sms():
+    state = await firebase_manager.get_data("Tracker/sms")
+    if isinstance(state, dict):
+        sms_store.load(state.get("messages"), state.get("index"), state.get("count"))
+
 async def webhook_storedsms(storedsms: SmsMessage, background_tasks: BackgroundTasks):
     """Handle Stored SMS messages from EMQX webhook"""
     try:
         storedsms_dict = storedsms.dict()
-        storedsms_dict["timestamp"] = datetime.now(timezone.utc).isoformat()
+        storedsms_dict["timestamp"] = message_time().isoformat()
         
         # Save to Firebase
         await firebase_manager.update_data("Tracker/storedsms", storedsms_dict)
+
+        record, is_new = sms_store.add(
+            storedsms.number, storedsms.message, storedsms.time_sent, storedsms.time_sent_human,
+            storedsms.index, message_time().timestamp()
+        )
+        update = {f"messages/{record.id}": record.to_dict()} if is_new else {}
+        if record.index is not None:
+            update[f"index/{record.index}"] = record.id
+        if update:
+            await firebase_manager.update_data("Tracker/sms", update)
         
         return {"success": True}
     except Exception as e:
@@ -692,7 +1532,14 @@ async def webhook_storedsms(storedsms: SmsMessage, background_tasks: BackgroundT
 async def webhook_newsms(data: str, background_tasks: BackgroundTasks):
     """Handle New SMS messages from EMQX webhook"""
     try:
-        await firebase_manager.update_data("Tracker/status/latest/stored_sms/stored_sms", data)
+        index = int(data) if data.strip().isdigit() else None
+        if index is not None:
+            await firebase_manager.update_data("Tracker/status/latest", {"stored_sms": index})
+            # The new message lands in the last slot
+            await record_sms_count(max(index, sms_store.count or 0))
+            if SMS_AUTO_FETCH:
+                # Through the command path so a sleeping tracker is woken first
+                background_tasks.add_task(execute_command, {"command": "sync_sms"})
 
         # Send notification
         notification = Notification(
@@ -708,31 +1555,72 @@ async def webhook_newsms(data: str, background_tasks: BackgroundTasks):
         logger.error(f"Error handling New SMS webhook: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# ESP-NOW rules, see espnow_rules.json for the format
+ESPNOW_RULES_PATH = os.getenv("ESPNOW_RULES", str(Path(__file__).parent / "espnow_rules.json"))
+
+def load_espnow_rules() -> EspNowRuleEngine:
+    try:
+        return EspNowRuleEngine.from_file(ESPNOW_RULES_PATH)
+    except FileNotFoundError:
+        logger.warning(f"No ESP-NOW rules at {ESPNOW_RULES_PATH}, using defaults")
+        return EspNowRuleEngine()
+
+espnow_engine = load_espnow_rules()
+
 async def webhook_espnow(data: str, background_tasks: BackgroundTasks):
     """Handle messages from espnow"""
     try:
-        await firebase_manager.push_data(
-            "Tracker/espnow/received",
-            {
-                "msg": data,
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            }
-        )
+        received = message_time()
+        now = received.timestamp()
+        sender = espnow_engine.sender_of(data)
+
+        # Collapse a node repeating itself into one entry with a count
+        repeat = espnow_engine.repeat_of(sender, data, now)
+        if repeat is not None:
+            ESPNOW_MESSAGES.inc(result="collapsed")
+            await firebase_manager.update_data(
+                f"Tracker/espnow/received/{repeat.key}",
+                {
+                    "count": repeat.count + 1,
+                    "last_timestamp": received.isoformat()
+                }
+            )
+            repeat.count += 1
+        else:
+            ESPNOW_MESSAGES.inc(result="stored")
+            key = await firebase_manager.push_data(
+                "Tracker/espnow/received",
+                {
+                    "msg": data,
+                    "sender": sender,
+                    "timestamp": received.isoformat()
+                }
+            )
+            espnow_engine.remember(sender, data, key, now)
 
-        notif_type = "high_priority" if ("IMPORTANT" in data or "DETECTED" in data) else "general"
+        # Rule windows and cooldowns only count stored messages, so a retry
+        # after a failed write can still fire
+        _, triggers = espnow_engine.evaluate(data, now)
+        if triggers:
+            # One notification per message, for the most urgent rule that fired
+            trigger = min(triggers, key=lambda t: t.rule.priority != "high_priority")
+            for t in triggers:
+                ESPNOW_TRIGGERS.inc(rule=t.rule.name)
 
-        # Send notification
-        notification = Notification(
-            title="ESP-NOW Message!",
-            message=data,
-            type=notif_type
-        )
-        background_tasks.add_task(send_notification, notification)
+            message = data if trigger.count <= 1 else f"{data} ({trigger.count}x in {int(trigger.rule.window)}s)"
+
+            # Send notification
+            notification = Notification(
+                title="ESP-NOW Message!",
+                message=message,
+                type=trigger.rule.priority
+            )
+            background_tasks.add_task(send_notification, notification)
 
         return {"success": True}
 
     except Exception as e:
-        logger.error(f"Error handling disconnection webhook: {str(e)}")
+        logger.error(f"Error handling espnow webhook: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 async def webhook_notification(notification: Notification, background_tasks: BackgroundTasks):
@@ -764,7 +1652,7 @@ async def webhook_logs(data: dict, background_tasks: BackgroundTasks):
             {
                 "type": log_type,
                 "log": log_msg,
-                "timestamp": datetime.now(timezone.utc).isoformat()
+                "timestamp": message_time().isoformat()
             }
         )
 
@@ -793,7 +1681,7 @@ async def webhook_connection(data: dict, background_tasks: BackgroundTasks):
                 f"Tracker/MQTT",
                 {
                     "connected": True,
-                    "last_connected": datetime.now(timezone.utc).isoformat()
+                    "last_connected": message_time().isoformat()
                 }
             )
 
@@ -822,7 +1710,7 @@ async def webhook_disconnection(data: dict, background_tasks: BackgroundTasks):
                 f"Tracker/MQTT",
                 {
                     "connected": False,
-                    "last_disconnected": datetime.now(timezone.utc).isoformat()
+                    "last_disconnected": message_time().isoformat()
                 }
             )
 
@@ -844,6 +1732,133 @@ async def webhook_disconnection(data: dict, background_tasks: BackgroundTasks):
 async def root():
     return {"message": "GPS Tracker Control API", "version": "6.9.0"}
 
+@api_router.get("/health")
+async def health():
+    """Liveness: the process is up and serving requests"""
+    return {"status": "alive"}
+
+@api_router.get("/ready")
+async def ready():
+    """Readiness: Firebase is initialized and, on the leader, the command listeners are attached"""
+    state = dict(readiness, firebase=firebase_ready.is_set(), leader=is_leader())
+    if outbox is not None:
+        state["outbox_depth"] = outbox.depth()
+        state["outbox_dead"] = outbox.dead_letters()
+    # Followers serve webhooks without listeners; only the leader needs them
+    is_ready = state["firebase"] and (state["listeners"] or not state["leader"])
+    return JSONResponse(status_code=200 if is_ready else 503, content={"ready": is_ready, **state})
+
+@api_router.get("/scheduler", dependencies=[Depends(require_leader)])
+async def scheduler_state():
+    """Learned movement profile, current recommendation and estimated savings"""
+    now = datetime.now(timezone.utc)
+    return {
+        "enabled": ADAPTIVE_WAKEUP,
+        "movement_probability": round(wake_scheduler.movement_probability(now), 3),
+        "recommendation": vars(wake_scheduler.recommend(now)),
+        "savings": wake_scheduler.savings(now),
+        **wake_scheduler.to_dict()
+    }
+
+@api_router.get("/live", dependencies=[Depends(require_leader)])
+async def live_stream(request: Request, kinds: Optional[str] = None):
+    """Server-sent events with the latest status, location and callstatus"""
+    sub = live.subscribe(kinds.split(",") if kinds else None)
+    return StreamingResponse(
+        live.stream(sub, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+class CommandRequest(BaseModel):
+    data1: str = ""
+    data2: str = ""
+
+@api_router.post("/commands/{command}", dependencies=[Depends(require_leader)])
+async def run_command(command: str, request: Optional[CommandRequest] = None, timeout: float = 60):
+    """Execute a command and, for requests, wait for the tracker's answer"""
+    if command not in KNOWN_COMMANDS:
+        raise HTTPException(status_code=404, detail=f"Unknown command: {command}")
+    body = request or CommandRequest()
+    pending = await execute_command({"command": command, "data1": body.data1, "data2": body.data2, "timeout": timeout})
+    if pending is None:
+        if command in REPLY_TOPICS:
+            raise HTTPException(status_code=504, detail=f"{command} was not sent; the tracker may be asleep")
+        return {"command": command, "response": None}
+
+    try:
+        response = await pending.wait()
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"Tracker did not answer {command} within {timeout:g}s")
+    except ConnectionError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+    return {
+        "id": pending.id,
+        "command": command,
+        "rtt_ms": int((time.monotonic() - pending.sent_at) * 1000),
+        "response": response
+    }
+
+@api_router.get("/commands/pending", dependencies=[Depends(require_leader)])
+async def pending_commands():
+    """Requests still waiting for a reply from the tracker"""
+    command_correlator.expire()
+    return {"pending": command_correlator.outstanding()}
+
+@api_router.post("/espnow/rules/reload")
+async def reload_espnow_rules():
+    """Re-read the ESP-NOW rules file without restarting"""
+    global espnow_engine
+    try:
+        espnow_engine = EspNowRuleEngine.from_file(ESPNOW_RULES_PATH)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid ESP-NOW rules: {e}")
+    return {"rules": [r.name for r in espnow_engine.rules]}
+
+@api_router.get("/telemetry", dependencies=[Depends(require_leader)])
+async def telemetry_series(resolution: str = "hour", fields: Optional[str] = None, since: Optional[datetime] = None):
+    """Min/max/avg of battery, signal and light level per minute, hour or day"""
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail=f"resolution must be one of {', '.join(RESOLUTIONS)}")
+    wanted = fields.split(",") if fields else None
+    if wanted and not set(wanted) <= set(TELEMETRY_FIELDS):
+        raise HTTPException(status_code=400, detail=f"fields must be among {', '.join(TELEMETRY_FIELDS)}")
+    return {
+        "resolution": resolution,
+        "points": telemetry.series(resolution, since.timestamp() if since else None, wanted)
+    }
+
+@api_router.get("/battery", dependencies=[Depends(require_leader)])
+async def battery_estimate():
+    """Discharge rates per power state and predicted time to empty"""
+    return battery_estimator.summary()
+
+@api_router.get("/sms", dependencies=[Depends(require_leader)])
+async def sms_messages(number: Optional[str] = None, before: Optional[str] = None, limit: int = 50):
+    """Indexed SMS newest first, optionally one conversation; pass "next" as before for older pages"""
+    try:
+        return sms_store.page(number, before, max(1, min(limit, 200)))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {before}")
+
+@api_router.get("/sms/threads", dependencies=[Depends(require_leader)])
+async def sms_threads():
+    """Conversations by correspondent, latest first, and what is left to fetch"""
+    return {
+        "stored": sms_store.count,
+        "indexed": len(sms_store.by_index),
+        "missing": sms_store.missing(),
+        "threads": sms_store.conversations(),
+    }
+
+@api_router.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of the counters and histograms above"""
+    LIVE_SUBSCRIBERS.set(len(live.subscribers))
+    LIVE_COALESCED.set(live.coalesced)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 @api_router.get("/heartbeat")
 async def heartbeat():
     backend_state = await firebase_manager.get_data("Backend/online")
@@ -858,7 +1873,9 @@ async def heartbeat():
 
     tracker_autowake = await firebase_manager.get_data("Preferences/tracker_autowake")
     if tracker_autowake is True:
-        await emqx_manager.publish("Tracker/to/mode", "0")
+        # With adaptive scheduling, only wake a tracker that has overslept its schedule
+        if not ADAPTIVE_WAKEUP or wake_scheduler.should_autowake(datetime.now(timezone.utc)):
+            await emqx_manager.publish("Tracker/to/mode", "0")
 
     tracker_connected = await firebase_manager.get_data("Tracker/MQTT/connected")
     if tracker_connected is False:
@@ -885,12 +1902,12 @@ app.add_middleware(
 )
 
 # Startup event
-@app.on_event("startup")
-async def startup_event():
-    global loop
-    try:
-        logger.info("GPS Tracker API started successfully")
+readiness = {"listeners": False, "emqx_checked": False}
+background_startup = set()
 
+async def refresh_tracker_connected():
+    """Query EMQX for a connected tracker and record it; runs after startup"""
+    try:
         tracker_connected = await emqx_manager.check_client()
 
         if tracker_connected:
@@ -901,10 +1918,91 @@ async def startup_event():
                     "last_connected": datetime.now(timezone.utc).isoformat()
                 }
             )
+    except Exception as e:
+        logger.error(f"Error checking tracker connection on startup: {str(e)}")
+    finally:
+        readiness["emqx_checked"] = True
+
+async def warm_up_clients():
+    """Lazy mode: create the Firebase app and attach listeners in the background"""
+    try:
+        await ensure_firebase()
+        if leader_elector is not None:
+            leader_elector.start()
+            logger.info("Firebase initialized, campaigning for leadership")
+            return
+        await asyncio.to_thread(start_listener)
+        logger.info("Firebase initialized and listeners attached")
+    except Exception as e:
+        logger.error(f"Error during background initialization: {str(e)}")
+
+async def drain_outbox_exclusive():
+    """Drain as the leader; the file lock covers a previous leader still finishing a batch"""
+    lease = FileLease(OUTBOX_PATH + ".drain")
+    try:
+        while not await asyncio.to_thread(lease.acquire):
+            await asyncio.sleep(LEADER_RENEW_INTERVAL)
+        logger.info(f"Draining outbox {OUTBOX_PATH}")
+        # Rows appended by followers since this process last counted
+        outbox.refresh()
+        await drain_outbox()
+    finally:
+        lease.release()
+
+drain_task: Optional[asyncio.Task] = None
+
+def start_drainer():
+    global drain_task
+    if drain_task is None or drain_task.done():
+        drain_task = asyncio.create_task(drain_outbox_exclusive())
+
+def stop_drainer():
+    global drain_task
+    if drain_task is not None:
+        drain_task.cancel()
+        drain_task = None
+    live_sent.clear()
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_startup.add(task)
+    task.add_done_callback(background_startup.discard)
+
+@app.on_event("startup")
+async def startup_event():
+    global loop
+    try:
+        logger.info("GPS Tracker API started successfully")
 
         loop = asyncio.get_running_loop()
+        loop_lag_monitor.start()
+
+        # Never hold up the first webhook on the EMQX client listing
+        run_in_background(refresh_tracker_connected())
 
-        start_listener()
+        if outbox is not None:
+            OUTBOX_DEPTH.set(outbox.depth())
+            OUTBOX_DEAD.set(outbox.dead_letters())
+            if leader_elector is None:
+                run_in_background(drain_outbox())
+            # Otherwise on_elected starts the drainer in the leader only
+
+        if ADAPTIVE_WAKEUP:
+            run_in_background(load_scheduler_state())
+
+        run_in_background(load_telemetry())
+        run_in_background(load_battery_state())
+        run_in_background(load_sms())
+
+        if GAZETTEER_PATH:
+            run_in_background(load_gazetteer())
+
+        if INIT_MODE == "lazy":
+            run_in_background(warm_up_clients())
+        elif leader_elector is not None:
+            leader_elector.start()
+        else:
+            start_listener()
         
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}")
@@ -913,6 +2011,21 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Cleanup on shutdown"""
+    loop_lag_monitor.stop()
+    for task in list(background_startup):
+        task.cancel()
+
+    if traffic_recorder is not None:
+        await asyncio.to_thread(traffic_recorder.close)
+
+    if leader_elector is not None:
+        was_leader = leader_elector.is_leader
+        await leader_elector.stop()
+        stop_drainer()
+        if not was_leader:
+            # Another instance is still serving; do not mark the backend offline
+            logger.info("GPS Tracker API shutdown completed")
+            return
 
     await firebase_manager.update_data(
         "Backend",
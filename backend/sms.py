@@ -0,0 +1,196 @@
+"""Local index of the SMS messages stored on the tracker's SIM.
+
+The tracker numbers its stored messages 1..stored_sms. Messages fetched
+from it are kept by a content id (so a message seen again under another
+index is not duplicated), with the current index -> id mapping, a global
+time order and one time-ordered thread per correspondent. Fetches ask for
+the indices not yet known, compressed into ranges ("1-4,7,9-12") so one
+request covers many messages.
+"""
+import bisect
+import hashlib
+import re
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+# Modem timestamps look like "24/05/12,10:33:00+22" (offset in quarter hours)
+GSM_TIME = re.compile(r"^(\d{2})/(\d{2})/(\d{2}),(\d{2}):(\d{2}):(\d{2})([+-]\d{1,2})?$")
+
+
+def parse_time_sent(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    value = value.strip().strip('"')
+    m = GSM_TIME.match(value)
+    if m:
+        yy, mo, dd, hh, mi, ss, quarters = m.groups()
+        tz = timezone(timedelta(minutes=15 * int(quarters))) if quarters else timezone.utc
+        try:
+            return datetime(2000 + int(yy), int(mo), int(dd), int(hh), int(mi), int(ss), tzinfo=tz).timestamp()
+        except ValueError:
+            return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def thread_key(number: str) -> str:
+    """Same correspondent with or without country code or trunk prefix"""
+    digits = re.sub(r"\D", "", number or "")
+    if len(digits) >= 10:
+        return digits[-10:]
+    return digits or (number or "").strip()
+
+
+def message_id(number: str, message: str, time_sent: Optional[str]) -> str:
+    raw = f"{number}\0{time_sent or ''}\0{message}".encode()
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+def to_ranges(indices: Iterable[int]) -> str:
+    """Compress indices into a range list, e.g. [1, 2, 3, 4, 7] -> 1-4,7"""
+    parts = []
+    ordered = sorted(set(indices))
+    i = 0
+    while i < len(ordered):
+        j = i
+        while j + 1 < len(ordered) and ordered[j + 1] == ordered[j] + 1:
+            j += 1
+        parts.append(str(ordered[i]) if i == j else f"{ordered[i]}-{ordered[j]}")
+        i = j + 1
+    return ",".join(parts)
+
+
+@dataclass
+class SmsRecord:
+    id: str
+    number: str
+    message: str
+    time_sent: Optional[str]
+    time_sent_human: Optional[str]
+    ts: float                      # send time if the modem gave one, else receive time
+    index: Optional[int] = None    # current slot on the SIM, if still known
+    thread: str = ""
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class SmsStore:
+    def __init__(self, fetch_timeout: float = 120.0):
+        self.fetch_timeout = fetch_timeout
+        self.messages: Dict[str, SmsRecord] = {}
+        self.by_index: Dict[int, str] = {}
+        self.by_time: List[Tuple[float, str]] = []
+        self.threads: Dict[str, List[Tuple[float, str]]] = {}
+        self.count: Optional[int] = None
+        # Indices requested from the tracker, oldest first, for replies that do not carry one
+        self.awaiting: Deque[Tuple[int, float]] = deque()
+
+    def _insert(self, record: SmsRecord):
+        self.messages[record.id] = record
+        entry = (record.ts, record.id)
+        bisect.insort(self.by_time, entry)
+        bisect.insort(self.threads.setdefault(record.thread, []), entry)
+
+    def add(self, number: str, message: str, time_sent: Optional[str], time_sent_human: Optional[str],
+            index: Optional[int], received_at: float) -> Tuple[SmsRecord, bool]:
+        """Store a fetched message; returns (record, whether it was new)"""
+        now = time.monotonic()
+        while self.awaiting and now - self.awaiting[0][1] > self.fetch_timeout:
+            self.awaiting.popleft()
+        if index is None and self.awaiting:
+            index = self.awaiting.popleft()[0]
+        elif index is not None:
+            self.awaiting = deque(a for a in self.awaiting if a[0] != index)
+
+        mid = message_id(number, message, time_sent)
+        record = self.messages.get(mid)
+        is_new = record is None
+        if is_new:
+            ts = parse_time_sent(time_sent) or received_at
+            record = SmsRecord(mid, number, message, time_sent, time_sent_human, ts, thread=thread_key(number))
+            self._insert(record)
+
+        if index is not None:
+            previous = self.by_index.get(index)
+            if previous is not None and previous != mid and previous in self.messages:
+                self.messages[previous].index = None
+            self.by_index[index] = mid
+            record.index = index
+        return record, is_new
+
+    def set_count(self, count: int) -> bool:
+        """Record the tracker's stored count; True if known indices were invalidated"""
+        shrunk = self.count is not None and count < self.count
+        self.count = count
+        if shrunk:
+            # Deleting shifts the slots after it, so no index can be trusted;
+            # messages stay and refetching only re-links them by content
+            for mid in self.by_index.values():
+                if mid in self.messages:
+                    self.messages[mid].index = None
+            self.by_index.clear()
+        return shrunk
+
+    def missing(self, limit: Optional[int] = None) -> List[int]:
+        """Indices on the SIM that are neither known nor already requested"""
+        if not self.count:
+            return []
+        requested = {i for i, _ in self.awaiting}
+        gaps = [i for i in range(1, self.count + 1) if i not in self.by_index and i not in requested]
+        return gaps[:limit] if limit else gaps
+
+    def expect(self, indices: Iterable[int]):
+        now = time.monotonic()
+        self.awaiting.extend((i, now) for i in indices)
+
+    def page(self, number: Optional[str] = None, before: Optional[str] = None, limit: int = 50) -> dict:
+        """Messages newest first; pass the returned cursor as before for the next page"""
+        entries = self.threads.get(thread_key(number), []) if number else self.by_time
+        end = len(entries)
+        if before:
+            ts, _, mid = before.partition(":")
+            end = bisect.bisect_left(entries, (float(ts), mid))
+        start = max(0, end - limit)
+        chunk = entries[start:end][::-1]
+        return {
+            "messages": [self.messages[mid].to_dict() for _, mid in chunk],
+            "next": f"{chunk[-1][0]}:{chunk[-1][1]}" if chunk and start > 0 else None,
+        }
+
+    def conversations(self) -> List[dict]:
+        threads = []
+        for key, entries in self.threads.items():
+            if not entries:
+                continue
+            last = self.messages[entries[-1][1]]
+            threads.append({
+                "thread": key,
+                "number": last.number,
+                "count": len(entries),
+                "last_message": last.message,
+                "last_ts": last.ts,
+            })
+        threads.sort(key=lambda t: t["last_ts"], reverse=True)
+        return threads
+
+    def load(self, messages: Optional[dict], index: Optional[dict], count: Optional[int]):
+        """Restore from the persisted Tracker/sms node"""
+        for data in (messages or {}).values():
+            if not isinstance(data, dict) or data.get("id") in self.messages:
+                continue
+            fields = {k: data.get(k) for k in SmsRecord.__dataclass_fields__}
+            fields["index"] = None
+            self._insert(SmsRecord(**fields))
+        for key, mid in (index or {}).items() if isinstance(index, dict) else enumerate(index or []):
+            if mid in self.messages:
+                self.by_index[int(key)] = mid
+                self.messages[mid].index = int(key)
+        if isinstance(count, int):
+            self.count = count
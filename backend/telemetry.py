@@ -0,0 +1,134 @@
+"""Rolling min/max/avg aggregates of status telemetry for charting.
+
+Each DeviceStatus sample is folded into the open minute, hour and day
+buckets in O(1). When a bucket's period ends it is closed, kept in a
+bounded deque and handed back to the caller to persist.
+"""
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+FIELDS = ("bat_voltage", "bat_percent", "gsm_rssi", "wifi_rssi", "light_level")
+
+# resolution -> (bucket length in seconds, buckets kept)
+RESOLUTIONS = {
+    "minute": (60, 1440),
+    "hour": (3600, 24 * 30),
+    "day": (86400, 365),
+}
+
+
+@dataclass
+class Bucket:
+    start: int
+    count: int = 0
+    stats: Dict[str, List[float]] = field(default_factory=dict)  # field -> [min, max, sum]
+
+    def add(self, sample: Dict[str, float]):
+        self.count += 1
+        for name, value in sample.items():
+            s = self.stats.get(name)
+            if s is None:
+                self.stats[name] = [value, value, value]
+            else:
+                if value < s[0]:
+                    s[0] = value
+                if value > s[1]:
+                    s[1] = value
+                s[2] += value
+
+    def to_dict(self) -> dict:
+        return {
+            "start": self.start,
+            "count": self.count,
+            **{
+                name: {"min": s[0], "max": s[1], "avg": round(s[2] / self.count, 3)}
+                for name, s in self.stats.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Bucket":
+        count = int(data.get("count", 0))
+        bucket = cls(int(data["start"]), count)
+        for name in FIELDS:
+            s = data.get(name)
+            if isinstance(s, dict):
+                bucket.stats[name] = [s["min"], s["max"], s["avg"] * count]
+        return bucket
+
+
+class TelemetryStore:
+    def __init__(self, resolutions: Optional[Dict[str, Tuple[int, int]]] = None):
+        self.resolutions = resolutions or RESOLUTIONS
+        self.closed: Dict[str, Deque[Bucket]] = {
+            res: deque(maxlen=keep) for res, (_, keep) in self.resolutions.items()
+        }
+        self.open: Dict[str, Optional[Bucket]] = {res: None for res in self.resolutions}
+
+    def add(self, status: dict, ts: float) -> List[Tuple[str, Bucket, Optional[Bucket]]]:
+        """Fold one status sample in; returns (resolution, closed bucket, evicted bucket) tuples"""
+        sample = {
+            name: float(status[name]) for name in FIELDS
+            if isinstance(status.get(name), (int, float)) and not isinstance(status.get(name), bool)
+        }
+        closed = []
+        for res, (length, _) in self.resolutions.items():
+            start = int(ts // length * length)
+            bucket = self.open[res]
+            if bucket is not None and bucket.start != start:
+                if start < bucket.start:
+                    # Late sample for an already closed period; not worth rewriting history
+                    continue
+                closed.append((res, bucket, self._close(res, bucket)))
+                bucket = None
+            if bucket is None:
+                bucket = self.open[res] = Bucket(start)
+            bucket.add(sample)
+        return closed
+
+    def _close(self, res: str, bucket: Bucket) -> Optional[Bucket]:
+        kept = self.closed[res]
+        evicted = kept[0] if len(kept) == kept.maxlen else None
+        kept.append(bucket)
+        return evicted
+
+    def load(self, res: str, buckets: Iterable[dict], now: float):
+        """Restore persisted buckets; one covering now becomes the open bucket again"""
+        length = self.resolutions[res][0]
+        current = int(now // length * length)
+        known = {b.start for b in self.closed[res]}
+        if self.open[res] is not None:
+            known.add(self.open[res].start)
+
+        restored = []
+        for data in buckets:
+            if "start" not in data or int(data["start"]) in known:
+                continue
+            bucket = Bucket.from_dict(data)
+            if bucket.start == current and self.open[res] is None:
+                self.open[res] = bucket
+            elif bucket.start < current:
+                restored.append(bucket)
+
+        merged = sorted(restored + list(self.closed[res]), key=lambda b: b.start)
+        self.closed[res].clear()
+        self.closed[res].extend(merged)
+
+    def open_buckets(self) -> List[Tuple[str, Bucket]]:
+        return [(res, b) for res, b in self.open.items() if b is not None]
+
+    def series(self, res: str, since: Optional[float] = None, fields: Optional[Iterable[str]] = None) -> List[dict]:
+        buckets = list(self.closed[res])
+        if self.open[res] is not None:
+            buckets.append(self.open[res])
+        wanted = set(fields) if fields else None
+        points = []
+        for bucket in buckets:
+            if since is not None and bucket.start + self.resolutions[res][0] <= since:
+                continue
+            point = bucket.to_dict()
+            if wanted is not None:
+                point = {k: v for k, v in point.items() if k in ("start", "count") or k in wanted}
+            points.append(point)
+        return points
@@ -0,0 +1,76 @@
+"""With INGEST_MODE=outbox, status and call status reach /api/live when queued.
+
+Run from backend/: python -m pytest tests (needs requirements-dev.txt)
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+# server reads its configuration at import time
+os.environ["INGEST_MODE"] = "outbox"
+os.environ["OUTBOX_PATH"] = os.path.join(tempfile.mkdtemp(), "outbox.db")
+os.environ["LEADER_ELECTION"] = "off"
+
+import fakes  # noqa: E402
+
+env = fakes.install()
+
+import httpx  # noqa: E402
+import server  # noqa: E402
+
+STATUS = {
+    "send_reason": 1, "screen_on": False, "sleep_mode": False, "currently_active": True,
+    "last_activity": "00:00:12", "bat_voltage": 3.97, "bat_percent": 32, "gsm_rssi": -83,
+    "wifi_enabled": False, "wifi_rssi": 0, "wifi": "", "in_call": False, "locked": False,
+    "light_level": 685, "uptime": "01:02:03", "espnow_state": 0, "stored_sms": 0,
+    "prd_eps": False, "ble_beacon": False, "gps_fix": False, "prd_wakeup_counter": 0,
+    "temp_contact": "", "build": "test",
+}
+
+
+async def ingest(bodies):
+    """Post bodies, wait for the drainer and return the live kinds sent, in order"""
+    env.database.reference("/").set({"Preferences": {"tracker_autowake": False}})
+    published = []
+    original = server.live.publish
+    server.live.publish = lambda kind, data: (published.append(kind), original(kind, data))
+    await server.app.router.startup()
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+            for body in bodies:
+                response = await client.post("/api/webhook/mqtt", json=body)
+                assert response.json().get("queued")
+            # Only the webhook has run so far; the drainer has not applied anything
+            at_ingest = list(published)
+            for _ in range(50):
+                await asyncio.sleep(0.05)
+                if server.outbox.depth() == 0:
+                    break
+    finally:
+        await server.app.router.shutdown()
+        server.live.publish = original
+    return at_ingest, published
+
+
+def test_call_status_reaches_live_at_ingest():
+    body = {"topic": "Tracker/from/call_status", "payload": json.dumps({"call_status": 2, "number": "+15550100"}),
+            "id": "call-1"}
+    at_ingest, published = asyncio.run(ingest([body]))
+
+    assert at_ingest == ["callstatus"]
+    # Applying the queued row must not send it again
+    assert published == ["callstatus"]
+    assert server.live.latest["callstatus"]["call_status"] == 2
+    assert env.database.snapshot()["Tracker"]["callstatus"]["call_status"] == 2
+
+
+def test_status_reaches_live_once():
+    body = {"topic": "Tracker/from/status", "payload": json.dumps(STATUS), "id": "status-1"}
+    at_ingest, published = asyncio.run(ingest([body]))
+
+    assert at_ingest == ["status"]
+    assert published == ["status"]
+    assert server.live.latest["status"]["bat_percent"] == 32